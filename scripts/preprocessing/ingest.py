@@ -0,0 +1,203 @@
+"""
+Ingest raw cohort downloads into the standardized files read by preprocessing step 1.
+
+Run from the repository root:
+
+    python scripts/preprocessing/ingest.py                          # every registered cohort
+    python scripts/preprocessing/ingest.py --cohorts aleppo weinstock
+
+Each cohort has an adapter (see `cohorts`) that streams its raw tables in record batches
+and turns every batch into the standard columns [id, time, gl] with vectorized parsing.
+Cohorts are processed in parallel (GLYMO_WORKERS processes) and each one is written to
+`data/processed/cgm/<cohort>_cgm.parquet` with a fixed schema, so step 1 reads typed
+columns instead of reparsing CSV text.
+"""
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+# Worker count and timestamp formats shared with the numbered preprocessing steps
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "preprocessing"))
+from parallel import default_workers
+from timestamps import parse_times
+
+raw_folder = "data/raw"
+standardized_folder = "data/processed/cgm/"  # Folder read by step 1
+block_size = 64 << 20  # Bytes of raw text parsed per record batch
+
+# Standardized output: one row per CGM reading
+schema = pa.schema([("id", pa.string()), ("time", pa.timestamp("ns")), ("gl", pa.float64())])
+
+# Registered cohorts: name (the ID prefix used from step 1 on) -> its raw download folder
+# under data/raw and its adapter. An adapter takes that folder and yields DataFrames with
+# the columns of `schema`.
+cohorts = {}
+
+
+def register(name, folder):
+    """Decorator adding an adapter to `cohorts` under `name`, reading data/raw/<folder>."""
+    def add(adapter):
+        cohorts[name] = {"folder": folder, "adapter": adapter}
+        return adapter
+    return add
+
+
+def header(path, delimiter):
+    """Column names of a delimited text file."""
+    with open(path, newline="") as f:
+        return next(csv.reader(f, delimiter=delimiter))
+
+
+def read_table(path, delimiter="|", columns=None, column_types=None):
+    """
+    Stream a delimited table in record batches, keeping only `columns` (names or positions).
+    Columns without an entry in `column_types` are read as strings, so a stray value never
+    makes the reader fail half way through a file; they are converted per batch instead.
+    """
+    names = header(path, delimiter)
+    columns = [names[c] if isinstance(c, int) else c for c in (columns or names)]
+    types = {name: pa.string() for name in columns}
+    types.update(column_types or {})
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+        convert_options=pacsv.ConvertOptions(include_columns=columns, column_types=types),
+    )
+    for batch in reader:
+        if batch.num_rows:
+            yield batch.rename_columns(columns)
+
+
+def numeric(text):
+    """float64 values of numeric text, parsed by Arrow (NaN where the text is empty or not a number)."""
+    text = pc.utf8_trim_whitespace(text)
+    valid = pc.match_substring_regex(text, r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+    values = pc.cast(pc.if_else(valid, text, pa.scalar(None, pa.string())), pa.float64())
+    return values.to_numpy(zero_copy_only=False)
+
+
+def seconds_of_day(tm):
+    """Seconds since midnight of "HH:MM:SS" strings (null where the text is not a valid time)."""
+    midnight = pc.strptime(pc.binary_join_element_wise("1970-01-01", tm, " "),
+                           format="%Y-%m-%d %H:%M:%S", unit="s", error_is_null=True)
+    return pc.cast(midnight, pa.int64()).to_numpy(zero_copy_only=False)
+
+
+def day_offset_times(base_date, days, tm):
+    """
+    Timestamps `base_date + days + time of day`, built arithmetically in int64 nanoseconds
+    (NaT where the day offset or the time is missing or invalid).
+    """
+    days = numeric(days)
+    seconds = pd.Series(seconds_of_day(tm), dtype="float64").to_numpy()
+    valid = ~(np.isnan(days) | np.isnan(seconds))
+    times = np.full(len(days), np.datetime64("NaT"), dtype="datetime64[ns]")
+    times[valid] = (np.datetime64(base_date, "ns")
+                    + days[valid].astype(np.int64) * np.timedelta64(1, "D")
+                    + seconds[valid].astype(np.int64) * np.timedelta64(1, "s"))
+    return times
+
+
+def standardize(ids, times, glucose):
+    """DataFrame with the columns of `schema` from Arrow text columns and parsed times."""
+    return pd.DataFrame({
+        "id": ids.to_numpy(zero_copy_only=False),
+        "time": np.asarray(times, dtype="datetime64[ns]"),
+        "gl": numeric(glucose),
+    })
+
+
+@register("aleppo", "Aleppo2017")
+def aleppo(folder):
+    # HDeviceCGM: patient (col 2), days from enrolment (col 4), time of day (col 5), glucose (col 9)
+    path = os.path.join(folder, "DataTables", "HDeviceCGM.txt")
+    for batch in read_table(path, columns=[2, 4, 5, 9]):
+        ptid, days, tm, glucose = batch.columns
+        times = day_offset_times("2015-05-22", days, tm)
+        # Only the first three characters of the glucose field hold the reading
+        yield standardize(ptid, times, pc.utf8_slice_codeunits(glucose, 0, 3))
+
+
+@register("weinstock", "Weinstock2016")
+def weinstock(folder):
+    path = os.path.join(folder, "Data Tables", "BDataCGM.txt")
+    for batch in read_table(path, columns=["PtID", "DeviceDaysFromEnroll", "DeviceTm", "Glucose"]):
+        times = day_offset_times("1990-01-01", batch.column("DeviceDaysFromEnroll"), batch.column("DeviceTm"))
+        yield standardize(batch.column("PtID"), times, batch.column("Glucose"))
+
+
+@register("tamborlane", "Tamborlane2008")
+def tamborlane(folder):
+    # One CSV per RTCGM table: [RecID,] patient, date-time, glucose. Date-times are parsed with
+    # the format registered in timestamps.time_formats (as Tamborlane2008.R reads them), so no
+    # batch pays for format inference; only rows that do not match it fall back to inference
+    folder = os.path.join(folder, "DataTables")
+    for filename in sorted(f for f in os.listdir(folder) if "RTCGM" in f):
+        path = os.path.join(folder, filename)
+        columns = [c for c in header(path, ",") if c != "RecID"][:3]
+        for batch in read_table(path, delimiter=",", columns=columns):
+            ptid, dttm, glucose = batch.columns
+            times, _ = parse_times(dttm, "tamborlane")
+            yield standardize(ptid, times, glucose)
+
+
+def output_path(name):
+    return os.path.join(standardized_folder, f"{name}_cgm.parquet")
+
+
+def ingest_cohort(name):
+    """
+    Run one cohort's adapter and stream its batches into `<cohort>_cgm.parquet`. Rows without
+    a valid time are dropped. The file is written under a temporary name and moved into
+    place at the end, so an interrupted run never leaves a partial file for step 1.
+    Returns (name, rows written, rows dropped).
+    """
+    os.makedirs(standardized_folder, exist_ok=True)
+    path = output_path(name)
+    written = dropped = 0
+    with pq.ParquetWriter(path + ".tmp", schema) as writer:
+        cohort = cohorts[name]
+        for df in cohort["adapter"](os.path.join(raw_folder, cohort["folder"])):
+            valid = df["time"].notna().to_numpy()
+            dropped += int((~valid).sum())
+            written += int(valid.sum())
+            writer.write_table(pa.Table.from_pandas(df[valid], schema=schema, preserve_index=False))
+    os.replace(path + ".tmp", path)
+    return name, written, dropped
+
+
+def ingest(names=None, n_workers=None):
+    """Ingest the given cohorts (default: all registered), one process per cohort."""
+    names = list(names or cohorts)
+    unknown = [name for name in names if name not in cohorts]
+    if unknown:
+        raise ValueError(f"Unknown cohorts {unknown}; registered: {sorted(cohorts)}")
+
+    n_workers = min(n_workers or default_workers(), len(names))
+    if n_workers <= 1:
+        results = [ingest_cohort(name) for name in names]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(ingest_cohort, names))
+    for name, written, dropped in results:
+        print(f"{name}: {written} readings saved to {output_path(name)}"
+              + (f" ({dropped} rows without a valid time dropped)" if dropped else ""))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Standardize raw cohort downloads for step 1")
+    parser.add_argument("--cohorts", nargs="+", choices=sorted(cohorts), help="Only ingest these cohorts (default: all)")
+    parser.add_argument("--workers", type=int, help="Processes to use (default: GLYMO_WORKERS or one per CPU)")
+    args = parser.parse_args()
+    ingest(args.cohorts, args.workers)
@@ -1,26 +1,141 @@
 import numpy as np
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+from positional_encoding import sinusoidal_table
 
 class MaskedCGMDataset(Dataset):
-    def __init__(self, masked_file, labels_file, mask_token=-1):
-        self.masked_data = np.load(masked_file, allow_pickle=True)  # Shape: (num_samples, 3168)
-        self.labels = np.load(labels_file, allow_pickle=True)  # Shape: (num_samples, 96)
+    """
+    Glucose windows and their mask labels (1 where a value is masked), as (seq_len, 1) tensors.
+
+    mask_mode="static": `masked_file` and `labels_file` are the pre-masked arrays from step 8.
+    mask_mode="dynamic": `masked_file` holds clean windows (step 7) and a fresh mask is drawn for
+    every batch, seeded from (seed, epoch, indices), so each epoch sees different masks but a run is
+    reproducible. With span_length > 1, runs of that many consecutive values are masked together.
+    Call `set_epoch` at the start of every epoch.
+
+    `transform` is applied to the windows as read, before masking: e.g. a `Normalizer` (see
+    src/preprocessing/normalization.py) to scale the mg/dL windows of step 7 on the fly. Step 8 files
+    are already normalized, so it is only accepted in dynamic mode.
+
+    Files are memory-mapped (`mmap_mode="r"`), so only the rows a batch needs are read. Either file
+    argument may also be a list of `.npy` shards with the same number of columns, read as one dataset.
+    Indexing with a list of indices returns a whole batch; see `batch_loader`.
+    """
+    def __init__(self, masked_file, labels_file=None, mask_token=-1, pe_dim=None,
+                 mask_mode="static", mask_prob=0.2, span_length=1, seed=0, mmap_mode="r", transform=None):
+        if mask_mode not in ("static", "dynamic"):
+            raise ValueError(f"mask_mode must be 'static' or 'dynamic', got {mask_mode!r}")
+        if mask_mode == "static" and labels_file is None:
+            raise ValueError("Static masking needs a labels_file")
+        if mask_mode == "static" and transform is not None:
+            raise ValueError("Static (step 8) windows are already normalized; transform needs mask_mode='dynamic'")
+
+        self.files = (masked_file, labels_file if mask_mode == "static" else None)
+        self.mmap_mode = mmap_mode
+        self.masked_data = self._open(masked_file, mmap_mode)  # Shards of (num_samples, seq_len), glucose only
+        self.labels = self._open(labels_file, mmap_mode) if mask_mode == "static" else None  # Shards of (num_samples, seq_len)
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.masked_data])
+        if self.labels is not None and [len(s) for s in self.labels] != [len(s) for s in self.masked_data]:
+            raise ValueError("Masked windows and labels have different shard sizes")
+        self.seq_len = self.masked_data[0].shape[1]
+
         self.mask_token = mask_token
+        self.mask_mode = mask_mode
+        self.mask_prob = mask_prob
+        self.span_length = span_length
+        self.seed = seed
+        self.epoch = 0
+        self.transform = transform
+
+        # The model adds positional encodings itself; set `pe_dim` to get them appended here instead
+        self.pe = torch.tensor(sinusoidal_table(self.seq_len, pe_dim)) if pe_dim else None
+
+    @staticmethod
+    def _open(files, mmap_mode):
+        files = [files] if isinstance(files, str) else list(files)
+        return [np.load(f, mmap_mode=mmap_mode) for f in files]
+
+    def __getstate__(self):
+        # DataLoader workers get a pickled copy: send the file names, not the (memory-mapped) data
+        state = self.__dict__.copy()
+        if self.mmap_mode is not None:
+            state["masked_data"] = state["labels"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.masked_data is None:
+            masked_file, labels_file = self.files
+            self.masked_data = self._open(masked_file, self.mmap_mode)
+            self.labels = self._open(labels_file, self.mmap_mode) if labels_file is not None else None
 
     def __len__(self):
-        return len(self.masked_data)
+        return int(self.offsets[-1])
 
-    def __getitem__(self, idx):
-        masked_window = self.masked_data[idx]  # Shape: (3168,)
-        label = self.labels[idx]  # Shape: (96,)
+    def set_epoch(self, epoch):
+        """Draw new dynamic masks for this epoch."""
+        self.epoch = epoch
+
+    def _take(self, shards, indices):
+        """Rows `indices` of the dataset stored in `shards`: one fancy-indexed read per shard touched."""
+        if len(shards) == 1:
+            return shards[0][indices]
+        shard_of = np.searchsorted(self.offsets, indices, side="right") - 1
+        rows = np.empty((len(indices), shards[0].shape[1]), dtype=shards[0].dtype)
+        for s in np.unique(shard_of):
+            selected = shard_of == s
+            rows[selected] = shards[s][indices[selected] - self.offsets[s]]
+        return rows
+
+    def sample_mask(self, shape, rng):
+        """Boolean (n, seq_len) mask covering about `mask_prob` of the values."""
+        if self.span_length <= 1:
+            return rng.random(shape) < self.mask_prob
+        # Span starts, each masking itself and the next span_length - 1 values (a moving sum of the starts)
+        starts = rng.random(shape) < self.mask_prob / self.span_length
+        covered = np.cumsum(starts, axis=1)
+        covered[:, self.span_length:] = covered[:, self.span_length:] - covered[:, :-self.span_length]
+        return covered > 0
 
-        # ✅ Convert to tensors
-        masked_window = torch.tensor(masked_window, dtype=torch.float32)
-        label = torch.tensor(label, dtype=torch.float32)
+    def get_batch(self, indices):
+        """Inputs and labels for several windows at once: (n, seq_len, 1) tensors."""
+        indices = np.asarray(indices, dtype=np.int64)
+        windows = np.asarray(self._take(self.masked_data, indices), dtype=np.float32)  # Fancy indexing already copies
+        if self.transform is not None:
+            windows = np.asarray(self.transform(windows), dtype=np.float32)
+
+        if self.mask_mode == "dynamic":
+            rng = np.random.default_rng([self.seed, self.epoch, *indices.tolist()])
+            mask = self.sample_mask(windows.shape, rng)
+            windows[mask] = self.mask_token  # Replace masked positions with the mask token
+            labels = mask.astype(np.float32)
+        else:
+            labels = np.asarray(self._take(self.labels, indices), dtype=np.float32)
+
+        # ✅ Reshape both to (n, seq_len, 1), or (n, seq_len, 1 + pe_dim) with positional encodings
+        masked_windows = torch.from_numpy(windows).unsqueeze(-1)
+        if self.pe is not None:
+            masked_windows = torch.cat([masked_windows, self.pe.expand(len(indices), -1, -1)], dim=-1)
+        return masked_windows, torch.from_numpy(labels).unsqueeze(-1)
+
+    def __getitem__(self, idx):
+        # A list of indices (from a BatchSampler) gives a whole batch
+        if np.ndim(idx):
+            return self.get_batch(idx)
+        masked_windows, labels = self.get_batch([idx])
+        return masked_windows[0], labels[0]
 
-        # ✅ Reshape `masked_window` to (96, 33) but `label` to (96, 1)
-        masked_window = masked_window.view(96, 33)
-        label = label.view(96, 1)  # ✅ Fix label shape!
+    def __getitems__(self, indices):
+        # Used by DataLoader(batch_size=...): one read and one mask draw, then stacked by collate
+        masked_windows, labels = self.get_batch(indices)
+        return list(zip(masked_windows, labels))
 
-        return masked_window, label
+def batch_loader(dataset, batch_size, shuffle=False, drop_last=False, sampler=None, **kwargs):
+    """
+    DataLoader that hands each batch of indices to the dataset in one call, so a batch is a single
+    fancy-indexed slice with no per-sample tensors or collation. A `sampler` (e.g. a
+    DistributedSampler) replaces the sequential or shuffled order.
+    """
+    if sampler is None:
+        sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last), batch_size=None, **kwargs)
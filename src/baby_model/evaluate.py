@@ -1,7 +1,5 @@
 import torch
-from model import TransformerModel
-from dataset import MaskedCGMDataset
-from torch.utils.data import DataLoader
+from inference import load_model, iter_outputs, default_mask_token
 import numpy as np
 
 # Parameters
@@ -9,35 +7,28 @@ test_masked_file = "data/processed/masked_windows_test.npy"
 test_labels_file = "data/processed/mask_labels_test.npy"
 model_path = "models/baby_transformer_cgm.pth"
 batch_size = 32
-mask_token = -1
 
 # Device setup
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# Load test dataset
-test_dataset = MaskedCGMDataset(test_masked_file, test_labels_file, mask_token=mask_token)
-test_dataloader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
+# Load the model with the hyperparameters it was trained with (saved in the checkpoint;
+# read from the weight shapes for checkpoints saved without them)
+model, normalizer = load_model(model_path, device)
+print(f"Model config: {model.config}")
+mask_token = default_mask_token(normalizer)  # Step 8 wrote masked and missing values as the normalizer's fill value
 
-# Load the model
-model = TransformerModel(embed_dim=64, num_heads=4, num_layers=2, dropout=0.1)
-model.load_state_dict(torch.load(model_path))
-model = model.to(device)
-model.eval()
+# Test windows (step 8: already normalized and masked) and their labels, read a batch at a time
+test_labels = np.load(test_labels_file, mmap_mode="r")
 
-# Evaluation loop
+# Evaluation loop: the glucose output (n, seq_len) against the labels (n, seq_len)
 all_preds, all_labels = [], []
-with torch.no_grad():
-    for batch in test_dataloader:
-        inputs, labels = batch
-        inputs, labels = inputs.to(device), labels.to(device)
-        
-        # Forward pass
-        outputs = model(inputs)
-        
-        # Store results
-        mask = labels != mask_token
-        all_preds.append(outputs[mask].cpu().numpy())
-        all_labels.append(labels[mask].cpu().numpy())
+for start, stop, inputs, glucose, _ in iter_outputs(model, test_masked_file, batch_size=batch_size, mask_token=mask_token):
+    labels = np.asarray(test_labels[start:stop], dtype=np.float32)
+
+    # Store results
+    mask = labels != mask_token
+    all_preds.append(glucose[mask])
+    all_labels.append(labels[mask])
 
 # Compute metrics
 all_preds = np.concatenate(all_preds)
@@ -0,0 +1,178 @@
+"""
+Batched inference with a pretrained TransformerModel: imputed glucose and one embedding per window.
+
+    from inference import load_model, predict
+    model, normalizer = load_model("models/baby_transformer_cgm.pth")
+    imputed, embeddings = predict(model, "data/processed/7_cgm_windows.npy", transform=normalizer,
+                                  embeddings_file="data/processed/embeddings.npy")
+
+or from the command line: python src/baby_model/inference.py --embeddings data/processed/embeddings.npy
+
+Windows are read from memory-mapped `.npy` files a batch at a time and results can be written
+straight to `.npy` files, so inputs and outputs may be larger than memory.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import torch
+from model import load_checkpoint
+from training import autocast
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from normalization import Normalizer, minmax_fill_value
+
+model_path = "models/baby_transformer_cgm.pth"
+windows_file = "data/processed/7_cgm_windows.npy"  # Step 7: glucose windows in mg/dL
+cpu_memory_budget = 64 * 2**20  # Bytes of activations per batch on CPU: small batches stay in cache and run faster
+max_batch_size = 8192
+
+
+def load_model(path=model_path, device=None, **overrides):
+    """
+    Model of a checkpoint (see model.load_checkpoint), in eval mode on `device`, and the
+    Normalizer it was trained with (None for checkpoints that do not record it).
+    """
+    device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    model, checkpoint = load_checkpoint(path, map_location=device, **overrides)
+    normalization = checkpoint.get("normalization")
+    normalizer = Normalizer(normalization, scheme=normalization["scheme"]) if normalization else None
+    return model, normalizer
+
+
+def open_windows(source):
+    """Shards of (n, seq_len) windows: a `.npy` path (memory-mapped), an array, or a list of either."""
+    sources = source if isinstance(source, (list, tuple)) else [source]
+    return [np.load(s, mmap_mode="r") if isinstance(s, (str, os.PathLike)) else np.asarray(s) for s in sources]
+
+
+def auto_batch_size(model, seq_len, device, budget=None):
+    """
+    Windows per batch whose activations fit `budget` bytes (default: half the free GPU memory,
+    or `cpu_memory_budget`). Layers run one after another, so the peak is about one layer's
+    attention scores and feed-forward activations.
+    """
+    config = model.config
+    per_window = 4 * seq_len * (2 * config["num_heads"] * seq_len + 2 * config["ff_dim"] + 8 * config["embed_dim"] + 2 * (1 + config["pe_dim"]))
+    if budget is None:
+        budget = torch.cuda.mem_get_info(device)[0] // 2 if device.type == "cuda" else cpu_memory_budget
+    return int(max(1, min(max_batch_size, budget // per_window)))
+
+
+def default_mask_token(transform):
+    """Value of missing and masked inputs: the fill value of a Normalizer `transform`, else -1."""
+    return getattr(transform, "fill_value", minmax_fill_value)
+
+
+def iter_outputs(model, windows, transform=None, batch_size=None, mask_token=None, amp=False):
+    """
+    Run the model over `windows` (see open_windows) in batches, under torch.inference_mode.
+
+    `transform` (e.g. the model's Normalizer) is applied to each batch as read; leave it out for
+    windows that are already normalized (step 8). Yields (start, stop, inputs, glucose, embeddings)
+    per batch: the model inputs (n, seq_len), the glucose channel of the output (n, seq_len) and
+    the encoder states averaged over the observed (not `mask_token`, see `default_mask_token`)
+    positions (n, embed_dim). On GPU, a batch that runs out of memory is retried at half the size.
+    """
+    mask_token = default_mask_token(transform) if mask_token is None else mask_token
+    device = next(model.parameters()).device
+    shards = open_windows(windows)
+    batch_size = batch_size or auto_batch_size(model, shards[0].shape[1], device)
+    model.eval()
+    offset = 0
+    for shard in shards:
+        start = 0
+        while start < len(shard):
+            stop = min(start + batch_size, len(shard))
+            inputs = np.array(shard[start:stop], dtype=np.float32)  # A writable copy of the batch
+            if transform is not None:
+                inputs = np.asarray(transform(inputs), dtype=np.float32)
+            try:
+                glucose, embeddings = _run_batch(model, torch.from_numpy(inputs).to(device), mask_token, amp)
+            except torch.cuda.OutOfMemoryError:
+                if batch_size == 1:
+                    raise
+                batch_size //= 2
+                torch.cuda.empty_cache()
+                continue
+            yield offset + start, offset + stop, inputs, glucose, embeddings
+            start = stop
+        offset += len(shard)
+
+
+@torch.inference_mode()
+def _run_batch(model, x, mask_token, amp):
+    with autocast(x.device, amp):
+        hidden = model.encode(x)
+        glucose = model.output_layer(hidden)[..., 0]
+    observed = (x != mask_token).unsqueeze(-1).to(hidden.dtype)
+    embeddings = (hidden * observed).sum(dim=1) / observed.sum(dim=1).clamp_min(1)
+    return glucose.float().cpu().numpy(), embeddings.float().cpu().numpy()
+
+
+def _output(path, shape):
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape) if path else np.empty(shape, dtype=np.float32)
+
+
+def predict(model, windows, transform=None, batch_size=None, impute=True, imputed_file=None,
+            embeddings_file=None, mask_token=None, amp=False, progress=False):
+    """
+    Imputed glucose (n, seq_len) and pooled embeddings (n, embed_dim) of all `windows`.
+
+    Imputed glucose keeps the observed values and fills the missing or masked ones (`mask_token`
+    after `transform`) with the model's glucose output. With a `transform` that has an `inverse`
+    (a Normalizer) it is returned in mg/dL, otherwise in the model's (normalized) units.
+    Outputs are written to `imputed_file` / `embeddings_file` (`.npy`, memory-mapped) when given,
+    else kept in memory; `impute=False` skips imputed glucose (returned as None).
+    """
+    shards = open_windows(windows)
+    n, seq_len = sum(len(s) for s in shards), shards[0].shape[1]
+    imputed = _output(imputed_file, (n, seq_len)) if impute or imputed_file else None
+    embeddings = _output(embeddings_file, (n, model.config["embed_dim"]))
+    inverse = getattr(transform, "inverse", None)
+    mask_token = default_mask_token(transform) if mask_token is None else mask_token
+
+    started = time.perf_counter()
+    for start, stop, inputs, glucose, pooled in iter_outputs(model, shards, transform, batch_size, mask_token, amp):
+        embeddings[start:stop] = pooled
+        if imputed is not None:
+            filled = np.where(inputs == mask_token, glucose, inputs)
+            imputed[start:stop] = inverse(filled) if inverse is not None else filled
+        if progress:
+            print(f"{stop}/{n} windows, {stop / (time.perf_counter() - started):.0f} windows/sec", end="\r")
+    if progress:
+        print()
+
+    for output in (imputed, embeddings):
+        if isinstance(output, np.memmap):
+            output.flush()
+    return imputed, embeddings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Imputed glucose and window embeddings from a pretrained model")
+    parser.add_argument("--model", default=model_path)
+    parser.add_argument("--input", nargs="+", default=[windows_file], help="Windows (.npy), in mg/dL unless --normalized-input")
+    parser.add_argument("--normalized-input", action="store_true", help="Inputs are already normalized (e.g. step 8 files)")
+    parser.add_argument("--embeddings", default="data/processed/embeddings.npy", help="Output (n, embed_dim) .npy")
+    parser.add_argument("--imputed", help="Output (n, seq_len) .npy of imputed glucose (not computed if omitted)")
+    parser.add_argument("--batch-size", type=int, help="Windows per batch (default: from the memory budget)")
+    parser.add_argument("--amp", action="store_true", help="Autocast (bf16 on CPU)")
+    parser.add_argument("--threads", type=int, help="CPU threads used by torch")
+    parser.add_argument("--num-heads", type=int, help="Attention heads of a checkpoint without config (default 4)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model, normalizer = load_model(args.model, **({"num_heads": args.num_heads} if args.num_heads else {}))
+    if normalizer is None and not args.normalized_input:
+        raise SystemExit(f"{args.model} does not record its normalization; pass --normalized-input with normalized windows")
+
+    started = time.perf_counter()
+    imputed, embeddings = predict(model, args.input, transform=None if args.normalized_input else normalizer,
+                                  batch_size=args.batch_size, impute=bool(args.imputed), imputed_file=args.imputed,
+                                  embeddings_file=args.embeddings, mask_token=default_mask_token(normalizer), amp=args.amp, progress=True)
+    seconds = time.perf_counter() - started
+    print(f"{len(embeddings)} windows in {seconds:.1f}s ({len(embeddings) / seconds:.0f} windows/sec)")
+    print(f"Embeddings saved to: {args.embeddings}" + (f", imputed glucose to: {args.imputed}" if args.imputed else ""))
@@ -1,12 +1,21 @@
+import os
 import torch
 import torch.nn as nn
+from positional_encoding import PositionalEncoding
 
 class TransformerModel(nn.Module):
-    def __init__(self, embed_dim=64, num_heads=8, ff_dim=256, num_layers=4, dropout=0.2):
+    def __init__(self, embed_dim=64, num_heads=8, ff_dim=256, num_layers=4, dropout=0.2, pe_dim=32, max_len=288, norm=True):
         super().__init__()
-        
+
+        # ✅ Saved with the weights (see save_checkpoint), so a checkpoint rebuilds its own model
+        self.config = dict(embed_dim=embed_dim, num_heads=num_heads, ff_dim=ff_dim, num_layers=num_layers,
+                           dropout=dropout, pe_dim=pe_dim, max_len=max_len, norm=norm)
+
+        # ✅ Sinusoidal positional encodings, appended to each glucose value (1 + pe_dim = 33 features)
+        self.positional_encoding = PositionalEncoding(pe_dim, max_len)
+
         # ✅ Input projection layer
-        self.input_layer = nn.Linear(33, embed_dim)  
+        self.input_layer = nn.Linear(1 + pe_dim, embed_dim)
 
         # ✅ Transformer layers with normalization
         encoder_layers = nn.TransformerEncoderLayer(
@@ -19,29 +28,69 @@ class TransformerModel(nn.Module):
         )
 
         self.transformer = nn.TransformerEncoder(encoder_layers, num_layers=num_layers)
-        
-        # ✅ Layer Normalization
-        self.norm = nn.LayerNorm(embed_dim)
-        
-        # ✅ Output projection layer
-        self.output_layer = nn.Linear(embed_dim, 33)  
 
-    def forward(self, x):
-        batch_size = x.shape[0]
+        # ✅ Layer Normalization (norm=False for the earliest checkpoints, trained without it)
+        self.norm = nn.LayerNorm(embed_dim) if norm else nn.Identity()
+
+        # ✅ Output projection layer
+        self.output_layer = nn.Linear(embed_dim, 1 + pe_dim)
 
-        # ✅ Ensure correct shape (batch_size, 96, 33)
-        x = x.view(batch_size, 96, 33)  
+    def encode(self, x):
+        """Hidden states (batch_size, seq_len, embed_dim) of the encoder, before the output projection."""
+        # ✅ Glucose only, (batch_size, seq_len) or (batch_size, seq_len, 1): add positional encodings here.
+        # Inputs that already carry them, (batch_size, seq_len, 1 + pe_dim), are used as they are.
+        if x.dim() == 2 or x.shape[-1] == 1:
+            x = self.positional_encoding(x)
 
         # ✅ Input projection
-        x = self.input_layer(x)  
+        x = self.input_layer(x)
 
         # ✅ Normalize before transformer
         x = self.norm(x)
 
         # ✅ Apply Transformer Encoder with residual connection
-        x = x + self.transformer(x)
+        return x + self.transformer(x)
+
+    def forward(self, x):
+        # ✅ Final projection back to original dimension: (batch_size, seq_len, 1 + pe_dim), glucose first
+        return self.output_layer(self.encode(x))
+
+
+def unwrap(model):
+    """The TransformerModel inside torch.compile / DistributedDataParallel wrappers, e.g. for its state_dict."""
+    model = getattr(model, "_orig_mod", model)
+    return getattr(model, "module", model)
+
+
+def save_checkpoint(model, path, **extra):
+    """Save weights with the model's config (and any `extra` entries, e.g. the normalization used)."""
+    model = unwrap(model)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    torch.save({"config": model.config, "state_dict": model.state_dict(), **extra}, path)
+
+
+def legacy_config(state_dict, num_heads=4, max_len=288):
+    """
+    Config of a plain state_dict (checkpoints saved before configs were): sizes are read from the
+    weight shapes; `num_heads` and `max_len` are not stored in them and default to train.py's.
+    The earliest checkpoints (e.g. the shipped models/baby_transformer_cgm.pth) have no `norm` layer.
+    """
+    layers = {key.split(".")[2] for key in state_dict if key.startswith("transformer.layers.")}
+    embed_dim, input_dim = state_dict["input_layer.weight"].shape
+    return dict(embed_dim=embed_dim, num_heads=num_heads, ff_dim=state_dict["transformer.layers.0.linear1.weight"].shape[0],
+                num_layers=len(layers), dropout=0.0, pe_dim=input_dim - 1, max_len=max_len,
+                norm="norm.weight" in state_dict)
 
-        # ✅ Final projection back to original dimension
-        x = self.output_layer(x)
 
-        return x
+def load_checkpoint(path, map_location="cpu", **overrides):
+    """
+    TransformerModel of a checkpoint, in eval mode, and the checkpoint dict. Reads both
+    {"config", "state_dict", ...} checkpoints and plain state_dicts; `overrides` replace config
+    entries (e.g. num_heads=8 for a plain state_dict trained with 8 heads).
+    """
+    checkpoint = torch.load(path, map_location=map_location, weights_only=True)
+    if "state_dict" not in checkpoint:
+        checkpoint = {"config": legacy_config(checkpoint), "state_dict": checkpoint}
+    model = TransformerModel(**{**checkpoint["config"], **overrides})
+    model.load_state_dict(checkpoint["state_dict"])
+    return model.to(map_location).eval(), checkpoint
@@ -0,0 +1,31 @@
+import functools
+import numpy as np
+import torch
+import torch.nn as nn
+
+@functools.lru_cache(maxsize=None)
+def sinusoidal_table(length, embed_dim):
+    """(length, embed_dim) sinusoidal positional encodings, computed once per shape and shared (read-only)."""
+    positions = np.arange(length).reshape(-1, 1)
+    div_terms = np.exp(np.arange(0, embed_dim, 2) * -(np.log(10000.0) / embed_dim))
+    table = np.zeros((length, embed_dim), dtype=np.float32)
+    table[:, 0::2] = np.sin(positions * div_terms)  # Sin for even indices
+    table[:, 1::2] = np.cos(positions * div_terms)  # Cos for odd indices
+    table.flags.writeable = False
+    return table
+
+class PositionalEncoding(nn.Module):
+    """Appends the positional encoding of each time step to its glucose value: (B, L) or (B, L, 1) -> (B, L, 1 + embed_dim)."""
+    def __init__(self, embed_dim=32, max_len=288):
+        super().__init__()
+        self.embed_dim = embed_dim
+        # Not persistent: rebuilt from the table, so it never ends up in checkpoints
+        self.register_buffer("pe", torch.tensor(sinusoidal_table(max_len, embed_dim)), persistent=False)
+
+    def forward(self, x):
+        if x.dim() == 2:
+            x = x.unsqueeze(-1)
+        if x.shape[1] > self.pe.shape[0]:
+            raise ValueError(f"Sequence length {x.shape[1]} exceeds max_len {self.pe.shape[0]}")
+        pe = self.pe[:x.shape[1]].to(x.dtype).expand(x.shape[0], -1, -1)
+        return torch.cat([x, pe], dim=-1)
@@ -0,0 +1,118 @@
+import contextlib
+import csv
+import json
+import os
+import resource
+import time
+import torch
+
+# Per-step fields of the log; times in seconds
+fields = ["epoch", "step", "samples", "data_s", "forward_s", "backward_s", "optimizer_s", "step_s", "samples_per_sec", "peak_mem_mb"]
+phases = ["forward", "backward", "optimizer"]
+
+
+def parse_steps(text):
+    """'START:STOP' (global steps, STOP excluded) -> range, e.g. '10:15' for five steps from step 10."""
+    start, stop = (int(part) for part in text.split(":"))
+    if not 0 <= start < stop:
+        raise ValueError(f"Profile steps need 0 <= START < STOP, got {text!r}")
+    return range(start, stop)
+
+
+class Telemetry:
+    """
+    Step-level training telemetry: time waiting for data (loader and copy to the device), in the
+    forward pass (with the loss), backward pass and optimizer step, samples/sec and peak memory,
+    one record per step written to `log_file` (JSON lines, or CSV if it ends in .csv).
+
+    With `profile_steps` (a range of global steps), torch.profiler records those steps and
+    writes a Chrome trace (chrome://tracing or https://ui.perfetto.dev) to `trace_file`; it
+    needs no display. On GPU every phase ends with a synchronize so its time is the device's,
+    which slows training a little: leave telemetry off for runs that do not need it.
+
+    Use as a context manager around training and pass it to `train_epoch`.
+    """
+    def __init__(self, log_file=None, device=torch.device("cpu"), profile_steps=None, trace_file="train_trace.json"):
+        self.log_file = log_file
+        self.device = device
+        self.profile_steps = profile_steps
+        self.trace_file = trace_file
+        self.epoch = self.global_step = 0
+        self.log = self.writer = self.profiler = None
+
+    def __enter__(self):
+        if self.log_file:
+            os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+            self.log = open(self.log_file, "w", newline="")
+            if self.log_file.endswith(".csv"):
+                self.writer = csv.DictWriter(self.log, fieldnames=fields)
+                self.writer.writeheader()
+        if self.profile_steps:
+            start = self.profile_steps.start
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.device.type == "cuda":
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.profiler = torch.profiler.profile(
+                activities=activities,
+                schedule=torch.profiler.schedule(skip_first=max(start - 1, 0), wait=0, warmup=min(start, 1), active=len(self.profile_steps), repeat=1),
+                on_trace_ready=self._export_trace, profile_memory=True)
+            self.profiler.__enter__()
+        self.last_end = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler is not None:
+            self.profiler.__exit__(*exc)
+        if self.log is not None:
+            self.log.close()
+
+    def _export_trace(self, profiler):
+        os.makedirs(os.path.dirname(self.trace_file) or ".", exist_ok=True)
+        profiler.export_chrome_trace(self.trace_file)
+        print(f"Profiler trace of steps {self.profile_steps.start}-{self.profile_steps.stop - 1} saved to: {self.trace_file}")
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def start_waiting(self):
+        """The data wait of the next step counts from now (`train_epoch` calls it before its first batch)."""
+        self.last_end = time.perf_counter()
+
+    def _sync(self):
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+
+    def begin_step(self):
+        """Call once the batch is on the device: the time since the last step is the data wait."""
+        self._sync()
+        now = time.perf_counter()
+        self.record = {"epoch": self.epoch, "step": self.global_step, "data_s": now - self.last_end, **{f"{p}_s": 0.0 for p in phases}}
+        self.step_start = now
+        if self.device.type == "cuda":
+            torch.cuda.reset_peak_memory_stats(self.device)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time one of `phases` of the current step (labelled in the profiler trace too)."""
+        start = time.perf_counter()
+        with torch.profiler.record_function(name) if self.profiler is not None else contextlib.nullcontext():
+            yield
+            self._sync()
+        self.record[f"{name}_s"] += time.perf_counter() - start
+
+    def end_step(self, samples):
+        self.last_end = time.perf_counter()
+        step_s = self.record["data_s"] + self.last_end - self.step_start
+        if self.device.type == "cuda":
+            peak = torch.cuda.max_memory_allocated(self.device)
+        else:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Process peak RSS (KiB on Linux)
+        self.record.update(samples=samples, step_s=step_s, samples_per_sec=samples / step_s, peak_mem_mb=peak / 2**20)
+
+        if self.writer is not None:
+            self.writer.writerow(self.record)
+        elif self.log is not None:
+            self.log.write(json.dumps(self.record) + "\n")
+        if self.profiler is not None:
+            self.profiler.step()
+        self.global_step += 1
@@ -1,11 +1,22 @@
+import argparse
+import contextlib
+import os
+import sys
 import torch
-import torch.nn as nn
+import matplotlib
+if not os.environ.get("DISPLAY") and os.name != "nt":
+    matplotlib.use("Agg")  # ✅ Headless (servers, batch jobs): figures are only saved
 import matplotlib.pyplot as plt
-from torch.utils.data import DataLoader
-from model import TransformerModel  # Ensure this matches (batch_size, 96, 32)
+from model import TransformerModel, save_checkpoint  # Adds positional encodings to (batch_size, seq_len, 1) inputs
 from dataset import MaskedCGMDataset  # Ensure correct reshaping
+from training import perf_defaults, make_loader, per_sample_loader, train_epoch, grad_scaler
+from telemetry import Telemetry, parse_steps
 import numpy as np
 
+# Glucose statistics from step 5 live with the preprocessing code
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from normalization import Normalizer, load_stats, stats_file
+
 # ✅ Hyperparameters
 embed_dim = 32
 num_heads = 4
@@ -14,107 +25,137 @@ dropout = 0.1
 learning_rate = 1e-4
 batch_size = 64  # ✅ Increased for efficiency
 epochs = 10
-mask_token = -1
 ff_dim = 128  # Transformer feedforward dimension
 accumulation_steps = 2  # ✅ For gradient accumulation (handles large batch sizes)
+mask_prob = 0.2  # ✅ Fresh masks are drawn every epoch (dynamic masking)
+span_length = 1  # Values masked together; > 1 for span masking
+seed = 0
+scheme = "minmax"  # Glucose normalization ("minmax" or "zscore"), applied as batches are read
+
+# ✅ File paths: clean windows from step 7 (mg/dL), normalized and masked on the fly
+masked_file = "data/processed/7_cgm_windows.npy"
 
-# ✅ File paths
-masked_file = "data/processed/masked_windows_aleppo.npy"
-labels_file = "data/processed/mask_labels_aleppo.npy"
+# Pre-masked windows from step 8 (mask_mode="static", no transform):
+#masked_file = "data/processed/masked_windows_aleppo.npy"
+#labels_file = "data/processed/mask_labels_aleppo.npy"
 
 #masked_file = "data/processed/masked_windows_lynch.npy"
 #labels_file = "data/processed/mask_labels_lynch.npy"
 
 model_save_path = "models/baby_transformer_cgm.pth"
-
-# ✅ Load dataset
-data = np.load(masked_file)
-print("Final dataset shape:", data.shape)  # Should be (num_samples, 96, 32)
+loss_plot_path = "models/baby_transformer_cgm_loss.png"
+sample_plot_path = "models/baby_transformer_cgm_sample.png"
+
+# ✅ Throughput settings: the defaults reproduce the plain loop; --perf turns on loader workers,
+# prefetching and autocast (bf16 on CPU). torch.compile is opt-in as it takes a while to warm up.
+parser = argparse.ArgumentParser(description="Pretrain the masked glucose transformer")
+parser.add_argument("--perf", action="store_true", help=f"Performance mode: {perf_defaults}")
+parser.add_argument("--workers", type=int, help="DataLoader worker processes (default: 0, or as --perf)")
+parser.add_argument("--prefetch", type=int, help="Batches prefetched by each worker")
+parser.add_argument("--amp", action=argparse.BooleanOptionalAction, help="Autocast the forward pass (bf16 on CPU)")
+parser.add_argument("--compile", action="store_true", help="torch.compile the model")
+parser.add_argument("--shuffle", action="store_true", help="Shuffle windows every epoch")
+parser.add_argument("--benchmark", type=int, metavar="STEPS", help="Report samples/sec of per-sample loading, batched loading and the chosen settings over STEPS batches, then exit")
+parser.add_argument("--telemetry", metavar="FILE", help="Write per-step timings, samples/sec and peak memory to FILE (.jsonl or .csv)")
+parser.add_argument("--profile-steps", type=parse_steps, metavar="START:STOP", help="Record these global steps with torch.profiler")
+parser.add_argument("--trace", default="models/train_trace.json", help="Chrome trace written for --profile-steps")
+args = parser.parse_args()
+settings = {"workers": 0, "prefetch": 2, "amp": False, **(perf_defaults if args.perf else {})}
+settings.update({k: getattr(args, k) for k in settings if getattr(args, k) is not None})
 
 # ✅ Device setup
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# ✅ Load dataset into DataLoader
-dataset = MaskedCGMDataset(masked_file, labels_file, mask_token=mask_token)
-dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=False)
+# ✅ Load dataset into DataLoader (memory-mapped; each batch is read in one slice)
+normalizer = Normalizer.load(stats_file, scheme=scheme)
+mask_token = normalizer.fill_value  # Masked values look like missing ones: outside the scaled range
+dataset = MaskedCGMDataset(masked_file, mask_token=mask_token, mask_mode="dynamic", mask_prob=mask_prob, span_length=span_length, seed=seed, transform=normalizer)
+print("Final dataset shape:", (len(dataset), dataset.seq_len))  # Should be (num_samples, seq_len), glucose only
+dataloader = make_loader(dataset, batch_size=batch_size, shuffle=args.shuffle, workers=settings["workers"],
+                         prefetch=settings["prefetch"], pin_memory=device.type == "cuda")
+print(f"Loader and precision settings: {settings}, compile={args.compile}, shuffle={args.shuffle}")
 
 # ✅ Initialize Transformer model
 model = TransformerModel(embed_dim=embed_dim, num_heads=num_heads, ff_dim=ff_dim, num_layers=num_layers, dropout=dropout)
 if torch.cuda.device_count() > 1:
-    print(f"Using {torch.cuda.device_count()} GPUs!")
-    model = nn.DataParallel(model)  # ✅ Multi-GPU support
+    # ✅ One process per GPU scales better than nn.DataParallel: see train_ddp.py
+    print(f"{torch.cuda.device_count()} GPUs found; training on one. Use torchrun train_ddp.py to train on all of them.")
 model = model.to(device)
+if args.compile:
+    model = torch.compile(model)
 
 # ✅ Verify first batch shape before training
 for batch in dataloader:
     inputs, labels = batch
-    print("Input shape before passing to model:", inputs.shape)  # Should be (batch_size, 96, 32)
+    print("Input shape before passing to model:", inputs.shape)  # Should be (batch_size, seq_len, 1)
     inputs, labels = inputs.to(device), labels.to(device)
     print("Mask Labels Shape:", labels.shape)
     print("Unique mask label values:", torch.unique(labels))
 
     # Forward pass
     outputs = model(inputs)
-    print("Output shape:", outputs.shape)  # Should match (batch_size, 96, 32)
+    print("Output shape:", outputs.shape)  # Should be (batch_size, seq_len, 33)
     print("Sample Outputs:", outputs[0, :5])  # Print first few predictions
     print("Sample Labels:", labels[0, :5].cpu().numpy())
     break  # Exit after one batch for debugging
 
-# ✅ Loss function & optimizer
-criterion = nn.SmoothL1Loss()  # ✅ Huber Loss is more robust for glucose
+# ✅ Loss (Smooth L1, robust for glucose; see training.masked_loss) & optimizer
 optimizer = torch.optim.AdamW(model.parameters(), lr=learning_rate)  # ✅ AdamW helps with weight decay
+scaler = grad_scaler(device, settings["amp"])
+
+# ✅ Samples/sec on the same data, then stop: the original per-window loading ("per-sample"),
+# batched reads with the default settings ("batched") and the chosen settings ("chosen").
+# All three use the current training step; two warm-up steps first, so compilation and
+# first-call costs are not counted.
+if args.benchmark:
+    plain_model = getattr(model, "_orig_mod", model)  # Not compiled
+    runs = [("per-sample", plain_model, per_sample_loader(dataset, batch_size, shuffle=args.shuffle), False),
+            ("batched", plain_model, make_loader(dataset, batch_size=batch_size, shuffle=args.shuffle), False),
+            ("chosen", model, dataloader, settings["amp"])]
+    for name, net, loader, amp in runs:
+        train_epoch(net, loader, optimizer, device, mask_token, accumulation_steps, amp=amp, max_steps=2)
+        _, samples, seconds = train_epoch(net, loader, optimizer, device, mask_token, accumulation_steps,
+                                          amp=amp, scaler=grad_scaler(device, amp), max_steps=args.benchmark)
+        print(f"{name}: {samples / seconds:.1f} samples/sec ({samples} samples in {seconds:.2f}s)")
+    sys.exit()
 
 # ✅ Track loss per epoch
 losses = []
 
-# ✅ Training loop with corrected masking
-for epoch in range(epochs):
-    model.train()
-    epoch_loss = 0
-    optimizer.zero_grad()
-
-    for step, batch in enumerate(dataloader):
-        inputs, labels = batch
-        inputs, labels = inputs.to(device), labels.to(device)
-
-        # Forward pass
-        outputs = model(inputs)
-
-        # ✅ Ensure mask shape matches (batch_size, 96, 33)
-        mask = labels != mask_token  # Create mask for valid values
-        mask = mask.expand(-1, -1, outputs.shape[-1])  # ✅ Expand mask to match last dimension
-
-        # ✅ Apply mask correctly
-        masked_outputs = outputs[mask]
-        masked_labels = labels.expand(-1, -1, outputs.shape[-1])[mask]  # ✅ Expand labels before masking
-
-        # ✅ Compute loss only on unmasked values
-        loss = criterion(masked_outputs, masked_labels)
-        loss = loss / accumulation_steps  # ✅ Scale loss for accumulation
-
-        # ✅ Backward pass with gradient accumulation
-        loss.backward()
-        if (step + 1) % accumulation_steps == 0:
-            optimizer.step()
-            optimizer.zero_grad()
-
-        epoch_loss += loss.item()
-
-    # ✅ Store loss per epoch
-    avg_loss = epoch_loss / len(dataloader)
-    losses.append(avg_loss)
-    print(f"Epoch {epoch + 1}/{epochs}, Loss: {avg_loss:.5f}")
-
-
-# ✅ Plot loss curve after training
+# ✅ Step telemetry (data wait, forward/backward/optimizer time, memory) and profiler window, if asked for
+telemetry = None
+if args.telemetry or args.profile_steps:
+    telemetry = Telemetry(args.telemetry, device=device, profile_steps=args.profile_steps, trace_file=args.trace)
+
+# ✅ Training loop: losses stay on the device until the end of the epoch
+with telemetry or contextlib.nullcontext():
+    for epoch in range(epochs):
+        dataset.set_epoch(epoch)  # ✅ New masks every epoch
+        if telemetry:
+            telemetry.set_epoch(epoch)
+        avg_loss, samples, seconds = train_epoch(model, dataloader, optimizer, device, mask_token, accumulation_steps,
+                                                 amp=settings["amp"], scaler=scaler, telemetry=telemetry)
+
+        # ✅ Store loss per epoch
+        losses.append(avg_loss)
+        print(f"Epoch {epoch + 1}/{epochs}, Loss: {avg_loss:.5f}, {samples / seconds:.1f} samples/sec")
+if args.telemetry:
+    print(f"Step telemetry saved to: {args.telemetry}")
+
+
+# ✅ Plot loss curve after training (saved, and shown when there is a display)
+os.makedirs(os.path.dirname(loss_plot_path), exist_ok=True)
 plt.plot(losses)
 plt.xlabel("Epoch")
 plt.ylabel("Loss")
 plt.title("Training Loss Curve")
-plt.show()
+plt.savefig(loss_plot_path)
+if matplotlib.get_backend().lower() != "agg":
+    plt.show()
 
 # ✅ Save the trained model
-torch.save(model.state_dict(), model_save_path)
+# ✅ Saved with its config and normalization, so inference.py can rebuild and feed it
+save_checkpoint(model, model_save_path, normalization={"scheme": scheme, **load_stats(stats_file)})
 print(f"Model saved to {model_save_path}")
 
 
@@ -132,4 +173,6 @@ plt.plot(true_values, label="True Glucose Values", linestyle="dashed")
 plt.plot(predicted_values, label="Predicted Glucose Values", alpha=0.7)
 plt.legend()
 plt.title("True vs. Predicted Glucose")
-plt.show()
+plt.savefig(sample_plot_path)
+if matplotlib.get_backend().lower() != "agg":
+    plt.show()
@@ -0,0 +1,158 @@
+"""
+Distributed pretraining with DistributedDataParallel: one process per GPU, or per CPU node/core.
+
+    torchrun --nproc_per_node=4 src/baby_model/train_ddp.py                # 4 GPUs (NCCL) or 4 CPU processes (gloo)
+    torchrun --nnodes=2 --node_rank=0 --nproc_per_node=1 \\
+        --master_addr=<host of rank 0> --master_port=29500 src/baby_model/train_ddp.py  # CPU nodes
+    torchrun --nproc_per_node=2 src/baby_model/train_ddp.py --check-grads  # DDP vs single-process gradients
+
+Each process reads its own share of the windows (DistributedSampler) and gradients are averaged
+across processes, so `--batch-size` is per process. Only rank 0 writes checkpoints (see model.save_checkpoint) and prints.
+Run without torchrun it trains as a single process.
+"""
+import argparse
+import contextlib
+import copy
+import os
+import sys
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data.distributed import DistributedSampler
+from model import TransformerModel, save_checkpoint
+from dataset import MaskedCGMDataset
+from training import make_loader, masked_loss, train_epoch
+from telemetry import Telemetry
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from normalization import Normalizer, load_stats, schemes, stats_file
+
+# Same defaults as train.py
+masked_file = "data/processed/7_cgm_windows.npy"
+model_save_path = "models/baby_transformer_cgm.pth"
+
+
+def setup():
+    """Join the process group (gloo on CPU, NCCL on GPU). Returns (rank, world_size, device)."""
+    # Without torchrun: a group of one
+    for name, value in [("RANK", "0"), ("LOCAL_RANK", "0"), ("WORLD_SIZE", "1"), ("MASTER_ADDR", "127.0.0.1"), ("MASTER_PORT", "29500")]:
+        os.environ.setdefault(name, value)
+    if torch.cuda.is_available():
+        device = torch.device("cuda", int(os.environ["LOCAL_RANK"]))
+        torch.cuda.set_device(device)
+        dist.init_process_group("nccl")
+    else:
+        device = torch.device("cpu")
+        dist.init_process_group("gloo")
+    return dist.get_rank(), dist.get_world_size(), device
+
+
+def check_grads(model, dataset, batch_size, rank, world_size, device, mask_token=-1, shuffle=False, seed=0):
+    """
+    Gradients of one DDP step against one single-process step on the concatenated batches of all
+    ranks, from the same initial weights (dropout off). Returns True on every rank if they match.
+
+    DDP averages the per-rank mean losses, while `masked_loss` divides by the number of labels that
+    are not `mask_token` on its own rank: the two agree only when every rank counts the same. That
+    holds here because labels are the 0/1 mask indicators and are never `mask_token`.
+    """
+    reference = copy.deepcopy(model)
+    ddp_model = DistributedDataParallel(model, device_ids=[device.index] if device.type == "cuda" else None)
+
+    # The first batch of every rank, as its DistributedSampler hands them out
+    batches = [list(DistributedSampler(dataset, world_size, r, shuffle=shuffle, seed=seed, drop_last=True))[:batch_size]
+               for r in range(world_size)]
+    inputs, labels = (t.to(device) for t in dataset.get_batch(batches[rank]))
+    masked_loss(ddp_model(inputs), labels, mask_token).backward()
+
+    matches = torch.ones((), device=device)
+    if rank == 0:
+        all_inputs, all_labels = zip(*(dataset.get_batch(b) for b in batches))
+        masked_loss(reference(torch.cat(all_inputs).to(device)), torch.cat(all_labels).to(device), mask_token).backward()
+        worst = max((p.grad - q.grad).abs().max().item() for p, q in zip(model.parameters(), reference.parameters()))
+        ok = all(torch.allclose(p.grad, q.grad, rtol=1e-4, atol=1e-6) for p, q in zip(model.parameters(), reference.parameters()))
+        print(f"DDP on {world_size} processes vs single process: max gradient difference {worst:.2e} ({'match' if ok else 'MISMATCH'})")
+        matches.fill_(float(ok))
+    dist.broadcast(matches, 0)
+    return bool(matches.item())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed pretraining of the masked glucose transformer")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64, help="Windows per process and step")
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--accumulation-steps", type=int, default=2)
+    parser.add_argument("--embed-dim", type=int, default=32)
+    parser.add_argument("--num-heads", type=int, default=4)
+    parser.add_argument("--ff-dim", type=int, default=128)
+    parser.add_argument("--num-layers", type=int, default=2)
+    parser.add_argument("--dropout", type=float, default=0.1)
+    parser.add_argument("--mask-prob", type=float, default=0.2)
+    parser.add_argument("--span-length", type=int, default=1)
+    parser.add_argument("--mask-token", type=float, help="Value of masked inputs (default: the normalizer's fill value)")
+    parser.add_argument("--scheme", default="minmax", choices=schemes, help="Glucose normalization")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shuffle", action="store_true")
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader workers per process")
+    parser.add_argument("--amp", action="store_true", help="Autocast the forward pass (bf16 on CPU)")
+    parser.add_argument("--masked-file", default=masked_file)
+    parser.add_argument("--output", default=model_save_path)
+    parser.add_argument("--check-grads", action="store_true", help="Compare one DDP step with single-process training, then exit")
+    parser.add_argument("--telemetry", metavar="FILE", help="Per-step timings of each process (.jsonl or .csv; the rank is added to the name)")
+    args = parser.parse_args()
+
+    rank, world_size, device = setup()
+    normalizer = Normalizer.load(stats_file, scheme=args.scheme)
+    mask_token = normalizer.fill_value if args.mask_token is None else args.mask_token
+    dataset = MaskedCGMDataset(args.masked_file, mask_token=mask_token, mask_mode="dynamic", mask_prob=args.mask_prob,
+                               span_length=args.span_length, seed=args.seed, transform=normalizer)
+
+    # Same initial weights on every rank (DDP also broadcasts rank 0's)
+    torch.manual_seed(args.seed)
+    model = TransformerModel(embed_dim=args.embed_dim, num_heads=args.num_heads, ff_dim=args.ff_dim, num_layers=args.num_layers,
+                             dropout=0.0 if args.check_grads else args.dropout).to(device)
+
+    if args.check_grads:
+        ok = check_grads(model, dataset, args.batch_size, rank, world_size, device, mask_token, args.shuffle, args.seed)
+        dist.destroy_process_group()
+        sys.exit(0 if ok else 1)
+
+    model = DistributedDataParallel(model, device_ids=[device.index] if device.type == "cuda" else None)
+    sampler = DistributedSampler(dataset, shuffle=args.shuffle, seed=args.seed, drop_last=True)
+    loader = make_loader(dataset, args.batch_size, sampler=sampler, workers=args.workers, pin_memory=device.type == "cuda")
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr)
+    if rank == 0:
+        print(f"{world_size} processes ({dist.get_backend()}), {len(sampler)} windows each of {len(dataset)}")
+
+    telemetry = None
+    if args.telemetry:
+        stem, ext = os.path.splitext(args.telemetry)
+        telemetry = Telemetry(f"{stem}.rank{rank}{ext}", device=device)
+
+    with telemetry or contextlib.nullcontext():
+        for epoch in range(args.epochs):
+            sampler.set_epoch(epoch)  # New order per epoch (with --shuffle)
+            dataset.set_epoch(epoch)  # New masks per epoch
+            if telemetry:
+                telemetry.set_epoch(epoch)
+            avg_loss, samples, seconds = train_epoch(model, loader, optimizer, device, mask_token, args.accumulation_steps,
+                                                     amp=args.amp, telemetry=telemetry)
+
+            # Loss averaged and samples/sec summed over all processes
+            totals = torch.tensor([avg_loss, samples / seconds], dtype=torch.float64, device=device)
+            dist.all_reduce(totals)
+            if rank == 0:
+                print(f"Epoch {epoch + 1}/{args.epochs}, Loss: {totals[0].item() / world_size:.5f}, {totals[1].item():.1f} samples/sec")
+
+                # Rank 0 checkpoints after every epoch; the weights are the same on every rank
+                save_checkpoint(model, args.output, normalization={"scheme": args.scheme, **load_stats(stats_file)})
+            dist.barrier()
+
+    if rank == 0:
+        print(f"Model saved to {args.output}")
+    dist.destroy_process_group()
+
+
+if __name__ == "__main__":
+    main()
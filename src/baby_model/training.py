@@ -0,0 +1,125 @@
+import contextlib
+import os
+import time
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Dataset
+from dataset import batch_loader
+
+# Settings of the performance mode (`train.py --perf`); each can still be set on its own
+perf_defaults = {"workers": min(4, os.cpu_count() or 1), "prefetch": 4, "amp": True}
+
+
+def masked_loss(outputs, labels, mask_token=-1):
+    """
+    Smooth L1 loss between outputs (B, L, C) and labels (B, L, 1), broadcast over the C features,
+    averaged over the positions whose label is not `mask_token`.
+
+    Same value as indexing with the mask expanded to (B, L, C), but the mask stays (B, L, 1) and
+    weights the element-wise loss, so no expanded mask or gathered copies are built each step.
+    """
+    outputs = outputs.float()
+    weight = (labels != mask_token).to(outputs.dtype)
+    per_value = F.smooth_l1_loss(outputs, labels.to(outputs.dtype).expand_as(outputs), reduction="none")
+    return (per_value * weight).sum() / (weight.sum() * outputs.shape[-1]).clamp_min(1)
+
+
+def amp_dtype(device):
+    """bfloat16 on CPU and on GPUs that support it, float16 (with a GradScaler) on older GPUs."""
+    if device.type == "cuda" and not torch.cuda.is_bf16_supported():
+        return torch.float16
+    return torch.bfloat16
+
+
+def autocast(device, enabled=True):
+    return torch.autocast(device.type, dtype=amp_dtype(device)) if enabled else contextlib.nullcontext()
+
+
+def grad_scaler(device, amp=False):
+    """Loss scaling, only enabled when autocast runs in float16."""
+    return torch.amp.GradScaler(device.type, enabled=amp and amp_dtype(device) == torch.float16)
+
+
+def make_loader(dataset, batch_size, shuffle=False, workers=0, prefetch=2, pin_memory=False, **kwargs):
+    """
+    `batch_loader` with `workers` loader processes, each keeping `prefetch` batches ready.
+    Workers are started again every epoch (not persistent) so they see `set_epoch`.
+    """
+    if workers > 0:
+        kwargs.update(num_workers=workers, prefetch_factor=prefetch)
+    return batch_loader(dataset, batch_size, shuffle=shuffle, pin_memory=pin_memory, **kwargs)
+
+
+class PerSample(Dataset):
+    """A dataset seen through `__getitem__` only, so a DataLoader reads it one window at a time."""
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        return self.dataset[idx]
+
+
+def per_sample_loader(dataset, batch_size, shuffle=False):
+    """
+    The original loading path: `DataLoader(dataset, batch_size)` reading and masking each window
+    on its own and collating them, instead of one batched read per step (see `batch_loader`).
+    Kept as the baseline of `train.py --benchmark`.
+    """
+    return DataLoader(PerSample(dataset), batch_size=batch_size, shuffle=shuffle)
+
+
+def train_epoch(model, loader, optimizer, device, mask_token=-1, accumulation_steps=1,
+                amp=False, scaler=None, max_steps=None, telemetry=None):
+    """
+    One pass over `loader` (or its first `max_steps` batches). Returns (mean loss, samples, seconds).
+
+    Losses are summed on the device and read once at the end, so no step waits for the device
+    to report its loss. With `amp`, the forward pass runs under autocast (see `amp_dtype`).
+    A `telemetry.Telemetry` records the time of each step's phases.
+    """
+    scaler = scaler or grad_scaler(device, amp)
+    non_blocking = device.type == "cuda"
+    phase = telemetry.phase if telemetry is not None else lambda name: contextlib.nullcontext()
+    model.train()
+    optimizer.zero_grad(set_to_none=True)
+    if telemetry is not None:
+        telemetry.start_waiting()
+
+    total_loss = torch.zeros((), device=device)
+    samples = steps = 0
+    start = time.perf_counter()
+    for step, (inputs, labels) in enumerate(loader):
+        if max_steps is not None and step >= max_steps:
+            break
+        inputs = inputs.to(device, non_blocking=non_blocking)
+        labels = labels.to(device, non_blocking=non_blocking)
+        if telemetry is not None:
+            telemetry.begin_step()
+
+        # Backward pass with gradient accumulation; DDP only averages gradients on the last micro-step
+        update = (step + 1) % accumulation_steps == 0
+        with contextlib.nullcontext() if update or not hasattr(model, "no_sync") else model.no_sync():
+            with phase("forward"), autocast(device, amp):
+                outputs = model(inputs)
+                loss = masked_loss(outputs, labels, mask_token) / accumulation_steps
+            with phase("backward"):
+                scaler.scale(loss).backward()
+        if update:
+            with phase("optimizer"):
+                scaler.step(optimizer)
+                scaler.update()
+                optimizer.zero_grad(set_to_none=True)
+
+        if telemetry is not None:
+            telemetry.end_step(len(inputs))
+        total_loss += loss.detach()
+        samples += len(inputs)
+        steps += 1
+
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    seconds = time.perf_counter() - start
+    return total_loss.item() / max(steps, 1), samples, seconds
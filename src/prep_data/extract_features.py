@@ -1,133 +1,82 @@
+import argparse
+import os
+import sys
 import pandas as pd
 import numpy as np
-from scipy import signal
-from tqdm.auto import tqdm
 
-tqdm.pandas()   # registers .progress_apply with pandas
+# Shared helpers live next to the numbered preprocessing stages
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from storage import read_stage, clear_stage, write_stage, export_csv
+from parallel import map_shards, default_workers
 
-cleaned_file = "data/processed/2_cleaned_cgm.csv"  # Path to save the cleaned file
-df = pd.read_csv(cleaned_file)  # Load the cleaned data
-df['time'] = pd.to_datetime(df['time'])
-df.sort_values(['ID', 'time'], inplace=True)
-df.set_index('time', inplace=True)
+cleaned_stage = "2_cleaned_cgm"  # Cleaned data from preprocessing step 2
 
-# Select only the relevant data for analysis
-df_dexcom = df[df['device']== 'intervals_5mins']
-df_dexcom = df_dexcom[~((df_dexcom['ID'].str.startswith('dexi'))|(df_dexcom['ID'].str.startswith('dexip')))]
 
+# Rolling 1h summaries (TIR, risk indices, MAGE) for many participants at once
+# (checked against the per-participant pandas reference in tests/test_rolling_metrics.py)
+from rolling_metrics import rolling_metrics
 
-# ----- helpers ------------------------------------------------------------- #
-def bgi_mgdl(g):
-    # Kovatchev 2006 constants for mg/dL
-    return 1.509 * (np.log(g) ** 1.084 - 5.381)
-
-def mage_window(x):
-    if x.size < 2:          # need at least two points to compute a diff
-        return np.nan
-    sd = np.std(x)
-    peaks, _   = signal.find_peaks(x,  prominence=sd)
-    troughs, _ = signal.find_peaks(-x, prominence=sd)
-    pts   = np.sort(np.concatenate((peaks, troughs, [0, x.size - 1])))
-    diffs = np.abs(np.diff(x[pts]))
-    return diffs.mean() if diffs.size else np.nan
-
-# ----- main rolling summary ------------------------------------------------ #
-def calculate_metrics(group):
-    # ── add the 20 min‐ago glucose ─────────────────────────────────────────────
-    group["glc_20_min_ago"] = group["glc"].shift(4)
-    
-    rolled = group["glc"].rolling("1h")      # no min_periods → every row gets output
-
-    # how many CGM points were in that hour?
-    group["samples_1h"] = rolled.count()
-
-    # core summaries
-    group["avg_glucose"] = rolled.mean()
-    group["sd_glucose"]  = rolled.std()
-
-    # time in range (mg/dL)
-    group["time_below_70"]  = rolled.apply(lambda x: (x <  70).mean(), raw=False)
-    group["time_70_180"]    = rolled.apply(lambda x: ((x >= 70) & (x <= 180)).mean(), raw=False)
-    group["time_above_180"] = rolled.apply(lambda x: (x > 180).mean(),             raw=False)
-
-    # glycaemic risk indices
-    group["hbgi"] = rolled.apply(lambda x: 10 * np.mean(np.square(np.maximum(bgi_mgdl(x), 0))),
-                                 raw=False)
-    group["lbgi"] = rolled.apply(lambda x: 10 * np.mean(np.square(np.minimum(bgi_mgdl(x), 0))),
-                                 raw=False)
-
-    # MAGE (1-h window)
-    group["mage"] = rolled.apply(mage_window, raw=True)
-
-    return group
-
-from tsfresh.feature_extraction import EfficientFCParameters
+def metrics_for_shard(shard):
+    # one worker's share of participants; rows stay indexed by time
+    return rolling_metrics(shard)
 
 # The full default set is 700+ features – far too slow for every 5-min sample.
-# EfficientFCParameters gives ~60 low-cost ones.
-ts_cfg = EfficientFCParameters()
-
-# If you only want a handful (e.g., autocorr lag-1, skewness, kurtosis) you can
-# pass a dict like {"absolute_sum_of_changes": None, "autocorrelation": [{"lag": 1}]}
-
-def build_windows_for_tsfresh(group):
-    """
-    group: one participant's CGM, indexed by time, columns ['glc', ...]
-    returns: DataFrame with cols ['id', 'time', 'value'] ready for tsfresh
-    """
-    # Create a unique window id for each row = current timestamp
-    idx = group.index                      # DateTimeIndex
-    window_ids = np.arange(len(idx))       # or use idx.astype("int64")
-
-    # Freeze the glucose slice for each row's PRECEDING hour.
-    # We collect them in one list to avoid Python loops.
-    series_list = []
-    for wid, t_end in zip(window_ids, idx):
-        win = group.loc[(t_end - pd.Timedelta("1h")): t_end, "glc"]
-        if win.empty:
-            continue
-        tmp = pd.DataFrame(
-            {"id": wid,
-             "time": win.index.astype("int64"),   # int time is fine for tsfresh
-             "value": win.values}
-        )
-        series_list.append(tmp)
-
-    return pd.concat(series_list, ignore_index=True)
-
-from tsfresh import extract_features
-
-def tsfresh_features_for_participant(group):
-    # build the long table
-    long_df = build_windows_for_tsfresh(group)
-
-    # run tsfresh ONCE
-    feats = extract_features(
-        long_df,
-        column_id="id",
-        column_sort="time",
-        column_kind=None,
-        column_value="value",
-        default_fc_parameters=ts_cfg,
-        n_jobs=0,                      # 0 → use all cores once, not per row
-        disable_progressbar=True,
-    )
-
-    # feats index is window id; align back to the original timestamps
-    feats.index = group.index[:len(feats)]   # same order we created ids
-
-    # concatenate with the simple rolling metrics you already have
-    out = pd.concat([group.reset_index(), feats.reset_index(drop=True)], axis=1)
-    return out
-
-metrics_df = (
-    df_dexcom
-      .sort_values(["ID", "time"])
-      .groupby("ID", group_keys=False)
-      .progress_apply(calculate_metrics)          # ← progress bar here
-      .groupby("ID", group_keys=False)
-      .progress_apply(tsfresh_features_for_participant)  # ← and here
-      .reset_index()                               # bring 'time' back
-)
-
-metrics_df.to_csv("data/processed/3_features_cgm.csv", index=False)
+# "efficient" (EfficientFCParameters) gives ~60 low-cost calculators; "glymo_fast" keeps the
+# cheapest informative ones for 1h CGM windows. Pick one with --feature-set; --profile times them.
+from feature_sets import feature_sets, get_feature_set, profile_calculators, suggest_fast_set
+
+feature_set = "efficient"
+profile_windows = 2000  # windows timed by --profile
+profile_file = "data/processed/feature_profile.csv"
+
+# Long tables for tsfresh, gathered with searchsorted window bounds instead of per-row .loc slices
+from tsfresh_windows import iter_long_tables
+from tsfresh_driver import extract_window_features
+
+long_table_rows = 1_000_000  # tsfresh input held at once (one batch of windows across participants)
+features_stage = "3_features_cgm"
+
+def profile(df, fc_parameters, n_windows=profile_windows, seed=0):
+    """Time each calculator on the windows of a random sample of participants and suggest a fast set."""
+    ids = np.random.default_rng(seed).permutation(df["ID"].unique())
+    sizes = df.groupby("ID").size().reindex(ids)
+    sample = df[df["ID"].isin(ids[:int(np.searchsorted(sizes.cumsum().to_numpy(), n_windows)) + 1])]
+    sample = sample.groupby("ID", group_keys=False).head(n_windows)
+    _, long_df = next(iter_long_tables(sample, max_rows=np.iinfo(np.int64).max))
+
+    # Importance proxy: how well each feature tracks glucose 30 minutes ahead
+    target = pd.Series(sample.groupby("ID")["glc"].shift(-6).to_numpy())
+    report = profile_calculators(long_df, target=target, fc_parameters=fc_parameters)
+    report.to_csv(profile_file, index=False)
+    print(report.to_string())
+    print(f"Profile of {long_df['id'].nunique()} windows saved to: {profile_file}")
+    print(f"Calculators under the cost budget: {sorted(suggest_fast_set(report, fc_parameters=fc_parameters))}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling metrics and tsfresh features for every CGM sample")
+    parser.add_argument("--feature-set", default=feature_set, choices=sorted(feature_sets), help="tsfresh calculators to run")
+    parser.add_argument("--profile", action="store_true", help="Time each calculator of the feature set on a sample and exit")
+    parser.add_argument("--profile-windows", type=int, default=profile_windows)
+    args = parser.parse_args()
+    ts_cfg = get_feature_set(args.feature_set)
+
+    df = read_stage(cleaned_stage, columns=["ID", "time", "glc", "device"])  # `time` is already datetime
+    df.sort_values(['ID', 'time'], inplace=True)
+    df.set_index('time', inplace=True)
+
+    # Select only the relevant data for analysis
+    df_dexcom = df[df['device']== 'intervals_5mins']
+    df_dexcom = df_dexcom[~((df_dexcom['ID'].str.startswith('dexi'))|(df_dexcom['ID'].str.startswith('dexip')))]
+
+    if args.profile:
+        profile(df_dexcom.dropna(subset=["glc"]), ts_cfg, n_windows=args.profile_windows)
+        sys.exit()
+
+    # rolling metrics: participants sharded over GLYMO_WORKERS processes
+    metrics = map_shards(metrics_for_shard, df_dexcom, progress=True)   # ← progress bar here
+
+    # tsfresh features: one pool for the whole run, each batch written out as soon as it is done
+    clear_stage(features_stage)
+    for batch in extract_window_features(metrics, ts_cfg, max_rows=long_table_rows, n_workers=default_workers(), progress=True):
+        write_stage(batch, features_stage, append=True)
+    export_csv(features_stage)  # legacy data/processed/3_features_cgm.csv with GLYMO_EXPORT_CSV=1
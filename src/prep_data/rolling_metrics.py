@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+# Every metric summarises the hour ending at (and including) each reading: (t - 1h, t]
+window = pd.Timedelta("1h")
+
+
+def bgi_mgdl(g):
+    # Kovatchev 2006 constants for mg/dL
+    return 1.509 * (np.log(g) ** 1.084 - 5.381)
+
+def mage_window(x):
+    if x.size < 2:          # need at least two points to compute a diff
+        return np.nan
+    sd = np.std(x)
+    peaks, _   = signal.find_peaks(x,  prominence=sd)
+    troughs, _ = signal.find_peaks(-x, prominence=sd)
+    pts   = np.sort(np.concatenate((peaks, troughs, [0, x.size - 1])))
+    diffs = np.abs(np.diff(x[pts]))
+    return diffs.mean() if diffs.size else np.nan
+
+
+def _peaks(x):
+    """
+    Boolean (n, L) mask of the peaks `signal.find_peaks(row, prominence=np.std(row))` returns for
+    every row of x (no NaN): local maxima, with flat tops reported at their middle sample, whose
+    prominence is at least the row's SD.
+    """
+    n, length = x.shape
+    positions = np.arange(length)
+
+    # Next sample whose value differs (capped at the last sample, as find_peaks scans no further)
+    next_diff = np.where(x[:, 1:] != x[:, :-1], positions[1:], length - 1)
+    next_diff = np.minimum.accumulate(next_diff[:, ::-1], axis=1)[:, ::-1]
+    ahead = np.concatenate([next_diff, np.full((n, 1), length - 1)], axis=1)
+
+    # A rise into a sample (or flat top) followed by a drop; the peak is the middle of the top
+    rows, start = np.nonzero(
+        (positions > 0) & (positions < length - 1)
+        & (np.roll(x, 1, axis=1) < x)
+        & (x[np.arange(n)[:, None], ahead] < x)
+    )
+    peak = (start + ahead[rows, start] - 1) // 2
+
+    # Prominence: the peak minus the higher of the lowest points on each side before higher ground
+    values = x[rows, peak]
+    row_values = x[rows]
+    higher = row_values > values[:, None]
+    left_stop = np.where(higher & (positions < peak[:, None]), positions, -1).max(axis=1)
+    right_stop = np.where(higher & (positions > peak[:, None]), positions, length).min(axis=1)
+    left_min = np.where((positions > left_stop[:, None]) & (positions <= peak[:, None]), row_values, np.inf).min(axis=1)
+    right_min = np.where((positions >= peak[:, None]) & (positions < right_stop[:, None]), row_values, np.inf).min(axis=1)
+    prominence = values - np.maximum(left_min, right_min)
+
+    keep = prominence >= np.std(x, axis=1)[rows]
+    mask = np.zeros(x.shape, dtype=bool)
+    mask[rows[keep], peak[keep]] = True
+    return mask
+
+def mage_batch(x):
+    """`mage_window` for every row of x, an (n, L) array of windows without NaN, with L >= 2."""
+    points = _peaks(x) | _peaks(-x)
+    points[:, [0, -1]] = True
+
+    # Difference between each turning point and the previous one
+    positions = np.arange(x.shape[1])
+    previous = np.maximum.accumulate(np.where(points, positions, 0), axis=1)
+    previous = np.concatenate([np.zeros((len(x), 1), dtype=previous.dtype), previous[:, :-1]], axis=1)
+    diffs = np.where(points, np.abs(x - np.take_along_axis(x, previous, axis=1)), 0.0)
+    return diffs[:, 1:].sum(axis=1) / (points.sum(axis=1) - 1)
+
+def rolling_mage(glc, starts, chunk_cells=2_000_000):
+    """
+    MAGE of the window starts[i] .. i for every row. Windows are grouped by length and computed
+    in batches with `mage_batch`; windows holding NaN fall back to `mage_window`.
+    """
+    n_rows = np.arange(len(glc)) + 1 - starts
+    missing = np.isnan(glc)
+    has_nan = rolling_sum(missing, starts) > 0
+    empty = rolling_sum(~missing, starts) == 0
+
+    mage = np.full(len(glc), np.nan)
+    for i in np.flatnonzero(has_nan & ~empty):
+        mage[i] = mage_window(glc[starts[i]:i + 1])
+
+    batched = ~has_nan & (n_rows >= 2)
+    for length in np.unique(n_rows[batched]):
+        rows = np.flatnonzero(batched & (n_rows == length))
+        view = sliding_window_view(glc, length)  # zero-copy; each row is gathered once below
+        step = max(1, chunk_cells // (length * length))
+        for chunk in range(0, len(rows), step):
+            selected = rows[chunk:chunk + step]
+            mage[selected] = mage_batch(view[starts[selected]])
+    return mage
+
+
+def calculate_metrics(group):
+    """Reference implementation: rolling summaries of one participant (indexed by time) with pandas."""
+    # ── add the 20 min‐ago glucose ─────────────────────────────────────────────
+    group["glc_20_min_ago"] = group["glc"].shift(4)
+
+    rolled = group["glc"].rolling(window)      # no min_periods → every row gets output
+
+    # how many CGM points were in that hour?
+    group["samples_1h"] = rolled.count()
+
+    # core summaries
+    group["avg_glucose"] = rolled.mean()
+    group["sd_glucose"]  = rolled.std()
+
+    # time in range (mg/dL)
+    group["time_below_70"]  = rolled.apply(lambda x: (x <  70).mean(), raw=False)
+    group["time_70_180"]    = rolled.apply(lambda x: ((x >= 70) & (x <= 180)).mean(), raw=False)
+    group["time_above_180"] = rolled.apply(lambda x: (x > 180).mean(),             raw=False)
+
+    # glycaemic risk indices
+    group["hbgi"] = rolled.apply(lambda x: 10 * np.mean(np.square(np.maximum(bgi_mgdl(x), 0))),
+                                 raw=False)
+    group["lbgi"] = rolled.apply(lambda x: 10 * np.mean(np.square(np.minimum(bgi_mgdl(x), 0))),
+                                 raw=False)
+
+    # MAGE (1-h window)
+    group["mage"] = rolled.apply(mage_window, raw=True)
+
+    return group
+
+
+def window_starts(ids, times, window=window):
+    """
+    First row of the window (t - window, t] ending at each row, for rows sorted by ID then time.
+    Windows never reach back into the previous participant.
+    """
+    times = np.asarray(times, dtype="datetime64[ns]")
+    boundaries = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1], True])
+    starts = np.empty(len(times), dtype=np.int64)
+    for start, stop in zip(boundaries[:-1], boundaries[1:]):
+        t = times[start:stop]
+        starts[start:stop] = start + np.searchsorted(t, t - window.to_timedelta64(), side="right")
+    return starts
+
+
+def rolling_sum(values, starts):
+    """Sum of `values` over rows starts[i] .. i for every row i, from one cumulative sum."""
+    cumulative = np.concatenate(([0], np.cumsum(values, dtype=np.float64)))
+    return cumulative[1:] - cumulative[starts]
+
+
+def rolling_metrics(df, window=window):
+    """
+    The columns of `calculate_metrics` for many participants at once. df: sorted by ID then
+    time, indexed by time, with columns ID and glc.
+
+    Counts, mean and SD come from pandas' rolling windows. Time-in-range fractions and the
+    risk indices are rolling means of per-reading indicator and risk columns, taken from
+    cumulative sums, with the NaN handling of the `rolling.apply` lambdas they replace:
+    fractions divide by all rows in the window, risk indices average the non-NaN values,
+    and windows without any reading give NaN. MAGE uses the batched kernel of `rolling_mage`.
+    """
+    out = df.copy()
+    glc = out["glc"].to_numpy(dtype=np.float64)
+    starts = window_starts(out["ID"].to_numpy(), out.index.to_numpy(), window)
+    n_rows = np.arange(len(out)) + 1 - starts
+    missing = np.isnan(glc)
+    empty = rolling_sum(~missing, starts) == 0
+
+    by_id = out.groupby("ID", sort=False)["glc"]
+    out["glc_20_min_ago"] = by_id.shift(4)
+    rolled = by_id.rolling(window)
+    out["samples_1h"] = rolled.count().to_numpy()
+    out["avg_glucose"] = rolled.mean().to_numpy()
+    out["sd_glucose"] = rolled.std().to_numpy()
+
+    def fraction(indicator):
+        # Share of the window's rows, NaN readings included, like Series.mean() of a boolean mask
+        return np.where(empty, np.nan, rolling_sum(indicator, starts) / n_rows)
+
+    def nan_mean(values):
+        # Mean over the window's non-NaN values, like np.mean(Series) (which skips NaN)
+        valid = ~np.isnan(values)
+        count = rolling_sum(valid, starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count == 0, np.nan, rolling_sum(np.where(valid, values, 0.0), starts) / count)
+
+    # time in range (mg/dL)
+    out["time_below_70"] = fraction(glc < 70)
+    out["time_70_180"] = fraction((glc >= 70) & (glc <= 180))
+    out["time_above_180"] = fraction(glc > 180)
+
+    # glycaemic risk indices
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bgi = bgi_mgdl(glc)
+    out["hbgi"] = 10 * nan_mean(np.square(np.maximum(bgi, 0)))
+    out["lbgi"] = 10 * nan_mean(np.square(np.minimum(bgi, 0)))
+
+    # MAGE (1-h window)
+    out["mage"] = rolling_mage(glc, starts)
+
+    return out
+
+
+def check_against_reference(df, n_ids=20, seed=0, rtol=1e-9):
+    """
+    Compare `rolling_metrics` with the pandas reference on a random sample of participants.
+    Raises AssertionError if they disagree; returns the number of participants checked.
+    """
+    ids = df["ID"].unique()
+    rng = np.random.default_rng(seed)
+    sample = df[df["ID"].isin(rng.choice(ids, size=min(n_ids, len(ids)), replace=False))]
+    sample = sample.reset_index().sort_values(["ID", "time"]).set_index("time")
+
+    expected = sample.groupby("ID", group_keys=False).apply(lambda g: calculate_metrics(g.copy()))
+    actual = rolling_metrics(sample)
+
+    pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=rtol)
+    return sample["ID"].nunique()
@@ -0,0 +1,54 @@
+import pandas as pd
+from tqdm.auto import tqdm
+from tsfresh import extract_features
+from tsfresh.utilities.distribution import MapDistributor, MultiprocessingDistributor
+from tsfresh_windows import iter_long_tables
+
+
+class PersistentDistributor(MultiprocessingDistributor):
+    """
+    tsfresh's multiprocessing pool, kept alive across extract_features calls (which otherwise
+    start and close a pool every time). Use it as a context manager or call `shutdown()`.
+    """
+    def close(self):
+        pass  # called by tsfresh after every extraction
+
+    def shutdown(self):
+        super().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def extract_window_features(df, fc_parameters, max_rows=1_000_000, n_workers=1, progress=False):
+    """
+    tsfresh features of the preceding-hour window of every row, for all participants at once.
+
+    df: sorted by ID then time, indexed by time, columns ID and glc (other columns are kept).
+    Windows are batched across participants into tsfresh runs of about `max_rows` long-table
+    rows that share one worker pool. Yields one frame per batch: the batch's rows, with `time`
+    as a column, and their features. Features are matched to rows by window id, so each row
+    keeps its own (ID, time) even if tsfresh drops a window (its features are then NaN).
+    """
+    distributor = (PersistentDistributor(n_workers, disable_progressbar=True) if n_workers > 1
+                   else MapDistributor(disable_progressbar=True))
+    try:
+        for rows, long_df in tqdm(iter_long_tables(df, max_rows=max_rows), disable=not progress, desc="tsfresh batches"):
+            feats = extract_features(
+                long_df,
+                column_id="id",
+                column_sort="time",
+                column_kind=None,
+                column_value="value",
+                default_fc_parameters=fc_parameters,
+                distributor=distributor,
+                disable_progressbar=True,
+            )
+            feats = feats.reindex(rows)  # window id = row position in df
+            yield pd.concat([df.iloc[rows].reset_index(), feats.reset_index(drop=True)], axis=1)
+    finally:
+        if isinstance(distributor, PersistentDistributor):
+            distributor.shutdown()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Each row's tsfresh window is the glucose of the preceding hour, both ends included: [t - 1h, t]
+window = pd.Timedelta("1h")
+
+
+def window_bounds(times, window=window, ids=None):
+    """
+    Row range [start, stop) of each row's window in one participant's sorted times, as
+    `group.loc[t - window : t]` selects it (so repeated timestamps are all included).
+    With `ids` (rows sorted by ID then time), windows stay within each participant.
+    """
+    times = np.asarray(times, dtype="datetime64[ns]")
+    if ids is None:
+        starts = np.searchsorted(times, times - window.to_timedelta64(), side="left")
+        stops = np.searchsorted(times, times, side="right")
+        return starts, stops
+
+    ids = np.asarray(ids)
+    boundaries = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1], True])
+    starts = np.empty(len(times), dtype=np.int64)
+    stops = np.empty(len(times), dtype=np.int64)
+    for first, last in zip(boundaries[:-1], boundaries[1:]):
+        starts[first:last], stops[first:last] = window_bounds(times[first:last], window)
+        starts[first:last] += first
+        stops[first:last] += first
+    return starts, stops
+
+
+def long_table(times, values, starts, stops, ids):
+    """
+    tsfresh long table [id, time, value] for the windows [starts[k], stops[k]) with ids[k],
+    gathered in one indexing step. `time` is nanoseconds since the epoch.
+    """
+    lengths = stops - starts
+    offsets = np.cumsum(lengths) - lengths
+    rows = np.repeat(starts, lengths) + (np.arange(lengths.sum()) - np.repeat(offsets, lengths))
+    return pd.DataFrame({
+        "id": np.repeat(ids, lengths),
+        "time": np.asarray(times, dtype="datetime64[ns]").astype(np.int64)[rows],
+        "value": np.asarray(values)[rows],
+    })
+
+
+def iter_long_tables(df, max_rows=1_000_000, window=window):
+    """
+    Long tables for the window of every row of df (sorted by ID then time, indexed by time,
+    columns ID and glc), in pieces of whole windows with at most about `max_rows` rows, so the
+    ~13x duplicated table is never held at once. Yields (rows, long_df): the positions of the
+    rows whose windows are in the piece, and the table, whose window ids are those positions.
+    """
+    times = df.index.to_numpy()
+    values = df["glc"].to_numpy()
+    starts, stops = window_bounds(times, window, ids=df["ID"].to_numpy())
+    offsets = np.concatenate(([0], np.cumsum(stops - starts)))  # long-table rows before each window
+    first = 0
+    while first < len(df):
+        last = max(first + 1, int(np.searchsorted(offsets, offsets[first] + max_rows, side="right")) - 1)
+        rows = np.arange(first, last)
+        yield rows, long_table(times, values, starts[first:last], stops[first:last], rows)
+        first = last
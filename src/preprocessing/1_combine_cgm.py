@@ -1,69 +1,144 @@
+import argparse
+import csv
 import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from storage import processed_folder, clear_stage, write_stage, export_csv
+from parallel import imap_bounded
+from timestamps import parse_times, outcomes
 
 # Define directories
-standardized_folder = "data/processed/cgm/"  # Folder containing standardized files
-output_file = "data/processed/1_combined_cgm.csv"
-
-# Ensure the output folder exists
-os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-# Initialize an empty list to store DataFrames
-dataframes = []
+standardized_folder = "data/processed/cgm/"  # Standardized files: CSV from the R scripts, Parquet from scripts/preprocessing/ingest.py
+output_stage = "1_combined_cgm"
+report_file = os.path.join(processed_folder, "1_time_parse_report.csv")  # how each file's times were parsed
 
 # Define file prefixes for different CGM devices
 intervals_5mins = ['dexi_', 'dexip_', 'aleppo_','extodedu_', 'chase_' , 'omalley_', 'weinstock_', 'lynch_']
 intervals_15mins = [ 'extod101_']
 combo = ['tamborlane_']
 
-# Define standard column names
-standard_columns = ["ID", "time", "glc", 'device']
-
-# Process each file
-for filename in os.listdir(standardized_folder):
-    if filename.endswith(".csv"):
-        file_path = os.path.join(standardized_folder, filename)
-        print(f"Processing file: {filename}")
-        
-        # Extract the prefix from the filename (everything before the first "_")
-        prefix = filename.split("_")[0] + "_"
-        
-        # Read the file
-        df = pd.read_csv(file_path)
-        
-        # Rename columns to standard names
-        df.rename(columns={"id": "ID", "gl": "glc"}, inplace=True)
-        
-        if prefix in ['dexi_', 'dexip_', 'extodedu_', 'extod101_']:
-            print(prefix+ ' is in the list')
-            df['glc'] = df['glc'] * 18
-
-        # Add device col
-        if prefix in intervals_5mins:
-            df['device'] = 'intervals_5mins'
-        elif prefix in intervals_15mins:
-            df['device'] = 'intervals_15mins'
-        else:
-            df['device'] = 'unknown'
-        print(df.device.value_counts())
-
-        # Ensure the file has the required columns
-        missing_columns = [col for col in standard_columns if col not in df.columns]
-        if missing_columns:
-            raise ValueError(f"File {filename} is missing columns: {missing_columns}")
-        
-        # Add the prefix to the ID column
-        df["ID"] = prefix + df["ID"].astype(str)
-        
-        # Reorder columns to standard order
-        df = df[standard_columns]
-        
-        # Add the DataFrame to the list
-        dataframes.append(df)
-
-# Concatenate all DataFrames
-combined_df = pd.concat(dataframes, ignore_index=True)
-
-# Save the combined DataFrame
-combined_df.to_csv(output_file, index=False)
-print(f"Combined CGM data saved to: {output_file}")
+# Cohorts whose files are in mmol/L
+mmol_prefixes = ['dexi_', 'dexip_', 'extodedu_', 'extod101_']
+
+# Accepted names of the columns every standardized file must have
+column_names = {"ID": ["id", "ID"], "time": ["time"], "glc": ["gl", "glc"]}
+
+# Output types: IDs and devices are dictionary-encoded (a few hundred distinct values over
+# millions of rows), glucose fits float32
+output_schema = pa.schema([
+    ("ID", pa.dictionary(pa.int32(), pa.string())),
+    ("time", pa.timestamp("ns")),
+    ("glc", pa.float32()),
+    ("device", pa.dictionary(pa.int32(), pa.string())),
+])
+
+
+def file_columns(path):
+    """Column names of a standardized file, from its header or Parquet schema only."""
+    if path.endswith(".parquet"):
+        return pq.read_schema(path).names
+    with open(path, newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def source_columns(path):
+    """{standard name: column in the file} for a standardized file; raises ValueError if one is missing."""
+    columns = file_columns(path)
+    found = {name: next((c for c in options if c in columns), None) for name, options in column_names.items()}
+    missing = [name for name, column in found.items() if column is None]
+    if missing:
+        raise ValueError(f"File {os.path.basename(path)} is missing columns: {missing} (has {columns})")
+    return found
+
+
+def read_csv(path, columns):
+    """
+    The needed columns of a standardized CSV, read by Arrow with `time` kept as Arrow text for
+    `parse_times`. Files whose other columns Arrow cannot type consistently are read by pandas.
+    """
+    options = pacsv.ConvertOptions(include_columns=list(columns.values()), column_types={columns["time"]: pa.string()})
+    try:
+        table = pacsv.read_csv(path, convert_options=options)
+    except pa.ArrowInvalid:
+        return pd.read_csv(path, usecols=list(columns.values()))
+    df = table.drop_columns([columns["time"]]).to_pandas()
+    df[columns["time"]] = pd.arrays.ArrowExtensionArray(table.column(columns["time"]))
+    return df
+
+
+def device_of(prefix):
+    if prefix in intervals_5mins:
+        return 'intervals_5mins'
+    if prefix in intervals_15mins:
+        return 'intervals_15mins'
+    return 'unknown'
+
+
+def read_file(path):
+    """
+    One standardized file as a DataFrame with the standard columns and output types.
+    Returns (filename, df, counts), counts being the `parse_times` outcome of its rows.
+    """
+    filename = os.path.basename(path)
+    prefix = filename.split("_")[0] + "_"
+    columns = source_columns(path)
+
+    # Read only the needed columns (Parquet files already carry a datetime `time` and numeric `gl`)
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=list(columns.values()))
+    else:
+        df = read_csv(path, columns)
+    df = df.rename(columns={column: name for name, column in columns.items()})
+
+    # Same column types for every cohort: CSV text is parsed here, once, with the cohort's format
+    df["time"], counts = parse_times(df["time"], prefix[:-1])
+    df["glc"] = pd.to_numeric(df["glc"], errors="coerce")
+    if prefix in mmol_prefixes:
+        df['glc'] = df['glc'] * 18
+
+    # Add the prefix to the ID column (once per distinct ID), and the device
+    codes, ids = pd.factorize(df["ID"], use_na_sentinel=False)
+    df["ID"] = pd.Categorical.from_codes(codes, [prefix + str(i) for i in ids])
+    df["device"] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), [device_of(prefix)])
+    df["glc"] = df["glc"].astype("float32")
+    return filename, df[output_schema.names], counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step 1: combine the standardized cohort files")
+    parser.add_argument("--cohorts", nargs="+", help="Only rebuild these cohorts (default: all)")
+    args = parser.parse_args()
+
+    paths = []
+    for filename in sorted(os.listdir(standardized_folder)):
+        # The prefix of the filename (everything before the first "_") is the cohort
+        if filename.endswith((".csv", ".parquet")) and (args.cohorts is None or filename.split("_")[0] in args.cohorts):
+            paths.append(os.path.join(standardized_folder, filename))
+
+    # Check every file's columns from its header before reading any of them
+    for path in paths:
+        source_columns(path)
+
+    # Files are read in parallel and appended as they arrive (in file order), so memory
+    # holds a few files at a time rather than the whole corpus
+    clear_stage(output_stage, args.cohorts)
+    report = []
+    for filename, df, counts in imap_bounded(read_file, paths):
+        print(f"Processed file: {filename} ({len(df)} rows, {df['device'].iloc[0] if len(df) else 'empty'})")
+        write_stage(df, output_stage, append=True, schema=output_schema)
+        report.append({"cohort": filename.split("_")[0], "file": filename, "rows": len(df), **counts})
+    export_csv(output_stage)
+
+    # Rows whose time could not be read with the cohort's format, per cohort
+    report = pd.DataFrame(report, columns=["cohort", "file", "rows", *outcomes])
+    report.to_csv(report_file, index=False)
+    per_cohort = report.groupby("cohort")[["rows", *outcomes]].sum()
+    flagged = per_cohort[per_cohort[["iso8601", "inferred", "unparseable"]].sum(axis=1) > 0]
+    if len(flagged):
+        print("Times not parsed with the cohort's format (see timestamps.time_formats):")
+        print(flagged.to_string())
+    print(f"Time parse report saved to: {report_file}")
+    print(f"Combined CGM data saved to stage: {output_stage}")
@@ -1,35 +1,45 @@
-import pandas as pd
-import numpy as np
-import os
-
-# Paths
-combined_file = "data/processed/1_combined_cgm.csv"  # Path to the combined file
-cleaned_file = "data/processed/2_cleaned_cgm.csv"  # Path to save the cleaned file
-
-# Ensure the output folder exists
-os.makedirs(os.path.dirname(cleaned_file), exist_ok=True)
-
-# Load the combined CGM data
-print(f"Loading data from: {combined_file}")
-df = pd.read_csv(combined_file)
-
-# Ensure `time` is in datetime format
-df["time"] = pd.to_datetime(df["time"], errors="coerce")
-
-# Round `time` to the nearest 5 minutes
-df["time"] = df["time"].dt.round("1min")
-
-# Drop duplicate rows after rounding
-df = df.drop_duplicates(subset=["ID", "time"])
-
-# Sort values by ID and time
-df = df.sort_values(by=["ID", "time"])
-
-# Ensure glucose values are numeric
-df["glc"] = pd.to_numeric(df["glc"], errors="coerce")
-#df = df.dropna(subset=["glc"])
-
-# Save the cleaned dataset
-df.to_csv(cleaned_file, index=False)
-
-print(f"Cleaning complete! Cleaned data saved to: {cleaned_file}")
+import argparse
+from functools import partial
+from storage import read_stage, list_cohorts, clear_stage, write_stage, export_csv
+from parallel import imap_bounded
+from cleaning import clean_cgm, dedup_policies
+
+# Stages
+combined_stage = "1_combined_cgm"  # Combined data from step 1
+cleaned_stage = "2_cleaned_cgm"  # Stage to save the cleaned data
+
+# Clean one cohort (run in a worker process): each cohort is read, sorted and written on
+# its own, so no step holds or sorts the whole combined data
+def clean_cohort(cohort, dedup="first"):
+    df = read_stage(combined_stage, cohorts=[cohort])
+
+    # Round `time` to the minute, drop colliding readings and sort by ID and time
+    # (`time` is already datetime64, parsed once in step 1, see timestamps.py)
+    n_rows = len(df)
+    df = clean_cgm(df, dedup=dedup)
+
+    # Step 1 stores device dictionary-encoded; from here on it is a plain string
+    df["device"] = df["device"].astype(str)
+    #df = df.dropna(subset=["glc"])
+    return cohort, df, n_rows - len(df)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step 2: clean the combined CGM data")
+    parser.add_argument("--cohorts", nargs="+", help="Only rebuild these cohorts (default: all)")
+    parser.add_argument("--dedup", default="first", choices=dedup_policies,
+                        help="Glucose kept for readings of one ID on the same minute")
+    args = parser.parse_args()
+
+    cohorts = [c for c in list_cohorts(combined_stage) if args.cohorts is None or c in args.cohorts]
+    print(f"Loading data from stage: {combined_stage} ({len(cohorts)} cohorts)")
+
+    # Save the cleaned dataset (typed, so later stages don't reparse `time`). Cohort
+    # partitions are read back in cohort order, so sorted cohorts need no global merge.
+    clear_stage(cleaned_stage, args.cohorts)
+    for cohort, df, n_dropped in imap_bounded(partial(clean_cohort, dedup=args.dedup), cohorts):
+        print(f"{cohort}: {len(df)} rows, {n_dropped} colliding readings merged ({args.dedup})")
+        if len(df):
+            write_stage(df, cleaned_stage)
+    export_csv(cleaned_stage)
+
+    print(f"Cleaning complete! Cleaned data saved to stage: {cleaned_stage}")
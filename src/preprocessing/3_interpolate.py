@@ -1,37 +1,31 @@
-import pandas as pd
-
-# Paths
-cleaned_file = "data/processed/2_cleaned_cgm.csv"
-interpolated_file = "data/processed/3_interpolated_cgm.csv"
-
-# Function to interpolate
-def interpolate_per_id(group):
-    # Resample only numeric columns (e.g., glucose values)
-    numeric_cols = ["glc"]
-    group_numeric = group.set_index("time")[numeric_cols].resample("5min").mean()
-
-    # Add back the ID column
-    group_numeric["ID"] = group["ID"].iloc[0]
-
-    # Interpolate glucose values
-    group_numeric["glc"] = group_numeric["glc"].interpolate(method="pchip", limit=4, limit_direction="forward").round(1)
-    
-    # Reset index to include 'time' as a column
-    return group_numeric.reset_index()
-
-# Chunk processing with groupby
-chunk_size = 500000  # Adjust chunk size
-header_written = False
-
-for chunk in pd.read_csv(cleaned_file, chunksize=chunk_size, parse_dates=["time"]):
-    print(f"Processing chunk with {len(chunk)} rows...")
-    chunk = chunk.sort_values(["ID", "time"])  # Ensure data is sorted by ID and time
-
-    # Apply interpolation per ID
-    interpolated_chunk = chunk.groupby("ID", group_keys=False).apply(interpolate_per_id)
-    
-    # Save results
-    interpolated_chunk.to_csv(interpolated_file, mode="a", index=False, header=not header_written)
-    header_written = True
-
-print(f"Interpolation complete! Results saved to: {interpolated_file}")
+import argparse
+from storage import iter_id_chunks, clear_stage, write_stage, export_csv
+from interpolation import interpolate_all
+from parallel import imap_bounded
+
+# Stages
+cleaned_stage = "2_cleaned_cgm"
+interpolated_stage = "3_interpolated_cgm"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step 3: resample to 5 min and interpolate short gaps")
+    parser.add_argument("--cohorts", nargs="+", help="Only rebuild these cohorts (default: all)")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows read per chunk (whole participants)")
+    args = parser.parse_args()
+
+    # Chunk processing, all IDs of a chunk interpolated in one vectorized pass.
+    # Chunks hold whole participants, so no series is split at a chunk boundary.
+    # Each worker takes a whole chunk, so memory is about one chunk per worker.
+    clear_stage(interpolated_stage, args.cohorts)
+
+    # Resample to 5 min and interpolate short gaps: chunks are streamed through one process
+    # pool and written out in order as they finish
+    chunks = iter_id_chunks(cleaned_stage, columns=["ID", "time", "glc"], cohorts=args.cohorts, chunk_size=args.chunk_size)
+    for interpolated_chunk in imap_bounded(interpolate_all, chunks):
+        print(f"Interpolated chunk with {len(interpolated_chunk)} rows")
+
+        # Save results
+        write_stage(interpolated_chunk, interpolated_stage, append=True)
+
+    export_csv(interpolated_stage)
+    print(f"Interpolation complete! Results saved to stage: {interpolated_stage}")
@@ -1,47 +1,38 @@
+import argparse
 import pandas as pd
+from storage import iter_id_chunks, clear_stage, write_stage, export_csv, cohort_of
+from days import complete_days, days_to_frame, min_readings
 
-# Load the cleaned CGM data
-df = pd.read_csv("data/processed/3_interpolated_cgm.csv", parse_dates=["time"])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step 4: keep complete days on a full 5-minute grid")
+    parser.add_argument("--cohorts", nargs="+", help="Only rebuild these cohorts (default: all)")
+    args = parser.parse_args()
 
-# Ensure `time` is in datetime format
-df["time"] = pd.to_datetime(df["time"])
+    # Stream the interpolated CGM data in chunks of whole participants (`time` is already datetime)
+    clear_stage("4_resampled_cgm", args.cohorts)
+    clear_stage("4_skipped_days", args.cohorts)
+    n_kept = 0
+    skipped_days = []
+    for df in iter_id_chunks("3_interpolated_cgm", columns=["time", "glc", "ID"], cohorts=args.cohorts):
+        # Count readings per participant and day, drop days below the threshold and
+        # place the rest on a (days, 288) grid in one vectorized pass
+        days, values, skipped = complete_days(df)
+        n_kept += len(days)
 
-# Create a `date` column for daily grouping
-df["date"] = df["time"].dt.date
+        # Save the resampled data (288 rows per kept day) and the skipped days
+        if len(days):
+            write_stage(days_to_frame(days, values), "4_resampled_cgm", append=True)
+        if len(skipped):
+            write_stage(skipped, "4_skipped_days", append=True)
+            skipped_days.append(skipped)
 
-# Define the minimum threshold for valid readings (90% of 288 = 259)
-min_readings = int(288 * 0.9)
+    export_csv("4_resampled_cgm")
 
-# Function to resample per day
-def resample_per_day(group):
-    # Count only non-NaN glucose values
-    non_nan_count = group["glc"].notna().sum()
-    
-    # Check if the group has at least the minimum number of valid readings
-    if non_nan_count < min_readings:
-        print(f"Skipping day {group['date'].iloc[0]} for participant {group['ID'].iloc[0]}: {non_nan_count} readings.")
-        return pd.DataFrame()  # Skip this day entirely
-    
-    # Create a full day of 5-minute intervals
-    full_day_index = pd.date_range(
-        start=f"{group['time'].iloc[0].date()} 00:00:00",
-        end=f"{group['time'].iloc[0].date()} 23:55:00",
-        freq="5min"
+    # Summary of skipped days instead of one line per day
+    skipped = pd.concat(skipped_days) if skipped_days else pd.DataFrame(columns=["ID", "date", "readings"])
+    summary = skipped.groupby(cohort_of(skipped["ID"]).values).agg(
+        participants=("ID", "nunique"), days_skipped=("date", "size"), median_readings=("readings", "median")
     )
-    
-    # Resample to ensure exactly 288 readings for the day
-    resampled = group.set_index("time").reindex(full_day_index)
-    resampled.index.name = "time"
-    
-    
-    # Add back metadata
-    resampled["ID"] = group["ID"].iloc[0]
-    resampled["date"] = group["date"].iloc[0]
-    return resampled.reset_index()
-
-# Apply the function per participant and date
-df_resampled = df.groupby(["ID", "date"]).apply(resample_per_day).reset_index(drop=True)
-
-# Save the resampled data
-df_resampled.to_csv("data/processed/4_resampled_cgm.csv", index=False)
-print("Resampling complete and saved!")
+    print(f"Kept {n_kept} days; skipped {len(skipped)} days with fewer than {min_readings} readings (see stage 4_skipped_days):")
+    print(summary.to_string() if len(summary) else "  none")
+    print("Resampling complete and saved!")
@@ -1,20 +1,18 @@
-from sklearn.preprocessing import MinMaxScaler
-import pandas as pd
+import argparse
+from storage import iter_stage_batches
+from normalization import RunningStats, save_stats, stats_file
 
-# Load the interpolated data
-df = pd.read_csv("data/processed/4_resampled_cgm.csv")
+input_stage = "4_resampled_cgm"
 
-# Normalize glucose values
-scaler = MinMaxScaler(feature_range=(0, 1))  # Use z-score if preferred
-df["glc"] = scaler.fit_transform(df["glc"].values.reshape(-1, 1))
+parser = argparse.ArgumentParser(description="Step 5: glucose statistics for normalization")
+parser.parse_args()
 
-# Save the scaler for inverse transformations later (optional)
-import joblib
-joblib.dump(scaler, "data/processed/scaler.pkl")
+# One streaming pass over the resampled data: min/max and mean/SD of glucose
+stats = RunningStats()
+for batch in iter_stage_batches(input_stage, columns=["glc"]):
+    stats.update(batch["glc"].to_numpy())
 
-# After scaling, set missing values to -1
-df["glc"] = df["glc"].fillna(-1)  
-
-# Save normalized data
-df.to_csv("data/processed/5_normalized_cgm.csv", index=False)
-print("Data normalized and saved!")
+# Only the statistics are saved; windows are scaled when they are used (step 8 and
+# MaskedCGMDataset(transform=Normalizer.load())), so no normalized copy of the data is written
+save_stats(stats, stats_file, source=input_stage, column="glc")
+print(f"Glucose statistics {stats.to_dict()} saved to: {stats_file}")
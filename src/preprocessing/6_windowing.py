@@ -1,57 +1,52 @@
-import numpy as np
+import argparse
+import os
 import pandas as pd
-
-# Load the normalized data
-df = pd.read_csv("data/processed/5_normalized_cgm.csv")
-
-# Ensure `time` is in datetime format
-df["time"] = pd.to_datetime(df["time"])
-
-# Create a `date` column for daily grouping
-df["date"] = df["time"].dt.date
-
-# Validate daily counts
-daily_counts = df.groupby(["ID", "date"]).size()
-print(f"Daily counts distribution:\n{daily_counts.value_counts()}")
-
-# Define window size and stride
-window_size = 288  # 24 hours at 5-min intervals
-stride = 144  # 50% overlap
-
-# Create sliding windows
-def create_windows(group):
-    # Ensure group is sorted by time
-    group = group.sort_values("time")
-
-    # Check if the group has enough data points
-    if len(group) < window_size:
-        print(f"Skipping ID {group['ID'].iloc[0]} with only {len(group)} points.")
-        return pd.DataFrame()  # Skip participants with too few data
-
-    # Extract glucose values and timestamps
-    values = group["glc"].values
-    times = group["time"].values
-
-    # Create sliding windows
-    windows = []
-    for i in range(0, len(values) - window_size + 1, stride):
-        if i + window_size <= len(values):
-            window = {
-                "ID": group["ID"].iloc[0],
-                "start_time": times[i],
-                **{f"glc_{j}": values[i + j] for j in range(window_size)},
-            }
-            windows.append(window)
-
-    return pd.DataFrame(windows)
-
-# Apply windowing per participant
-windows = df.groupby("ID").apply(create_windows).reset_index(drop=True)
-
-# Validate window sizes
-window_sizes = windows.apply(lambda x: len(x), axis=1)
-print(f"Window sizes distribution:\n{window_sizes.value_counts()}")
-
-# Save windows
-windows.to_csv("data/processed/6_cgm_windows.csv", index=False)
-print(f"Sliding windows created and saved!")
+from storage import read_stage, clear_stage, list_cohorts, write_windows, stage_path, export_csv_enabled
+from windowing import create_windows, window_size, stride
+
+input_stage = "4_resampled_cgm"  # Glucose in mg/dL; windows are normalized when used (see normalization.py)
+output_stage = "6_cgm_windows"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step 6: cut each participant into sliding windows")
+    parser.add_argument("--cohorts", nargs="+", help="Only rebuild these cohorts (default: all)")
+    parser.add_argument("--window-size", type=int, default=window_size)
+    parser.add_argument("--stride", type=int, default=stride)
+    parser.add_argument("--split-on-gaps", action="store_true", help="Never let a window span a gap in time (e.g. a removed day)")
+    args = parser.parse_args()
+
+    cohorts = args.cohorts or list_cohorts(input_stage)
+    clear_stage(output_stage, args.cohorts)
+
+    # Legacy wide CSV (ID, start_time, glc_0 ... glc_N), only written on request
+    csv_file = stage_path(output_stage) + ".csv"
+    if export_csv_enabled and os.path.exists(csv_file):
+        os.remove(csv_file)
+
+    # One cohort at a time: windows are written as `<stage>/cohort=<name>/windows.npy` + `index.parquet`.
+    # No process pool (step 6 used map_shards before windowing was vectorized): on 200 participants
+    # (900k rows) create_windows takes ~0.2s, while map_shards with 4 workers and a function that
+    # does nothing already takes ~0.3s to start the pool and ship the shards
+    for cohort in cohorts:
+        # Load the resampled data (`time` is already stored as datetime)
+        df = read_stage(input_stage, columns=["time", "glc", "ID"], cohorts=[cohort])
+        if not len(df):
+            continue
+
+        # Validate daily counts
+        daily_counts = df.groupby(["ID", df["time"].dt.date]).size()
+        print(f"[{cohort}] Daily counts distribution:\n{daily_counts.value_counts()}")
+
+        windows, index = create_windows(df, window_size=args.window_size, stride=args.stride, split_on_gaps=args.split_on_gaps)
+        too_short = sorted(set(df["ID"].unique()) - set(index["ID"].unique()))
+        if too_short:
+            print(f"[{cohort}] Skipping {len(too_short)} IDs with fewer than {args.window_size} points: {too_short}")
+        print(f"[{cohort}] {windows.shape[0]} windows of {windows.shape[1]} samples from {index['ID'].nunique()} IDs")
+
+        write_windows(windows, index, output_stage, cohort)
+
+        if export_csv_enabled:
+            wide = pd.concat([index, pd.DataFrame(windows, columns=[f"glc_{j}" for j in range(args.window_size)])], axis=1)
+            wide.to_csv(csv_file, mode="a", index=False, header=not os.path.exists(csv_file))
+
+    print(f"Sliding windows created and saved!")
@@ -1,90 +1,43 @@
 import numpy as np
 import pandas as pd
+from storage import list_cohorts, read_windows
 
 # File paths
-input_file = "data/processed/6_cgm_windows.csv"
-output_file = "data/processed/7_cgm_windows_with_pe_test.csv"
+input_stage = "6_cgm_windows"
+output_file = "data/processed/7_cgm_windows.npy"
 
-# Parameters
-window_size = 288
-embed_dim = 32
+# Positional encodings are no longer stored with every window: the model appends them
+# from a cached table (src/baby_model/positional_encoding.py), so only glucose is kept here.
 chunk_size = 1000  # Keep it manageable
-
-# Positional encoding function (without flattening)
-def positional_encoding(window_size, embed_dim):
-    positions = np.arange(window_size).reshape(-1, 1)
-    div_terms = np.exp(np.arange(0, embed_dim, 2) * -(np.log(10000.0) / embed_dim))
-    sinusoidals = np.zeros((window_size, embed_dim))
-    sinusoidals[:, 0::2] = np.sin(positions * div_terms)  # Sin for even indices
-    sinusoidals[:, 1::2] = np.cos(positions * div_terms)  # Cos for odd indices
-    return sinusoidals
-
-# Generate PE **without flattening**
-pe = positional_encoding(window_size, embed_dim)  # Shape: (288, 32)
-
-# **New column naming convention**
-glucose_colnames = [f"glc_{t}" for t in range(window_size)]
-pe_colnames = [f"pe_{t}_{d}" for t in range(window_size) for d in range(embed_dim)]
-
-# Process in chunks and save incrementally
-header_written = False
-last_user = None  # Track previous user
-
-for chunk_idx, chunk in enumerate(pd.read_csv(input_file, chunksize=chunk_size)):
-    print(f"Processing chunk {chunk_idx + 1} with {len(chunk)} rows...")
-
-    # **Extract user ID before dropping it**
-    user_ids = chunk["ID"].values  
-
-    # **Drop ID and start_time before further processing**
-    chunk = chunk.drop(columns=["ID", "start_time"])  
-
-    # Extract glucose columns
-    glucose_columns = [col for col in chunk.columns if col.startswith("glc_")]
-    glucose_data = chunk[glucose_columns].values  # Shape: (chunk_size, 288)
-
-    # **Repeat PE for all rows in this chunk**
-    pe_repeated = np.tile(pe, (len(glucose_data), 1, 1))  # Shape: (chunk_size, 288, 32)
-    pe_reshaped = pe_repeated.reshape(len(glucose_data), -1)  # Flatten to (chunk_size, 288*32)
-
-    # **Insert padding row when user changes**
-    cleaned_glucose_data = []
-    cleaned_pe_data = []  # New list for PE padding
-
-    for i in range(len(glucose_data)):
-        user_id = user_ids[i]
-
-        # If user ID changes, insert a padding row
-        if last_user is not None and user_id != last_user:
-            padding_glucose = np.full((1, 288), -1)  # ✅ Glucose padding
-            padding_pe = np.full((1, 288 * 32), -1)  # ✅ PE padding
-
-            cleaned_glucose_data.append(padding_glucose)
-            cleaned_pe_data.append(padding_pe)
-
-            print(f"Inserted padding row between {last_user} -> {user_id}")
-
-        # Append normal data
-        cleaned_glucose_data.append(glucose_data[i])
-        cleaned_pe_data.append(pe_reshaped[i])  # ✅ Use pre-repeated PE
-
-        last_user = user_id  # Update last seen user
-
-    # Convert lists to NumPy arrays
-    cleaned_glucose_data = np.vstack(cleaned_glucose_data)  # ✅ Ensures rectangular shape
-    cleaned_pe_data = np.vstack(cleaned_pe_data)  # ✅ Ensures rectangular shape
-
-    # Convert to DataFrame
-    glucose_df = pd.DataFrame(cleaned_glucose_data, columns=glucose_colnames)
-    pe_df = pd.DataFrame(cleaned_pe_data, columns=pe_colnames)  # ✅ Use cleaned PE data
-
-    # Combine glucose + PE
-    final_df = pd.concat([glucose_df, pe_df], axis=1)
-
-    print("Final shape before saving:", final_df.shape)  # ✅ Debugging check
-
-    # **Write to CSV immediately (incremental saving)**
-    final_df.to_csv(output_file, mode="a", index=False, header=not header_written)
-    header_written = True  # Ensures header is only written once
-
-print(f"Windows with positional encodings saved to: {output_file}")
+padding_value = np.nan  # Row inserted between two participants (missing: the fill value once normalized)
+
+cohorts = list_cohorts(input_stage)
+if not cohorts:
+    raise SystemExit(f"No windows found in {input_stage}")
+index = pd.concat([read_windows(input_stage, cohort)[1] for cohort in cohorts], ignore_index=True)
+if not len(index):
+    raise SystemExit(f"No windows found in {input_stage}")
+window_size = read_windows(input_stage, cohorts[0])[0].shape[1]
+
+# **Insert padding row when user changes**: output row of every window
+user_ids = index["ID"].to_numpy()
+new_user = np.zeros(len(user_ids), dtype=bool)
+new_user[1:] = user_ids[1:] != user_ids[:-1]
+rows = np.arange(len(user_ids)) + np.cumsum(new_user)
+print(f"{len(user_ids)} windows from {len(set(user_ids))} users, {new_user.sum()} padding rows")
+
+# Write straight into the output file, chunk by chunk
+output = np.lib.format.open_memmap(output_file, mode="w+", dtype=np.float32, shape=(len(user_ids) + int(new_user.sum()), window_size))
+output[rows[new_user] - 1] = padding_value
+
+offset = 0
+for cohort in cohorts:
+    windows, cohort_index = read_windows(input_stage, cohort)
+    for start in range(0, len(cohort_index), chunk_size):
+        stop = min(start + chunk_size, len(cohort_index))
+        output[rows[offset + start:offset + stop]] = windows[start:stop]
+    offset += len(cohort_index)
+    print(f"Processed {cohort}: {len(cohort_index)} windows")
+
+output.flush()
+print(f"Windows saved to: {output_file}, Shape: {output.shape}")
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+# Readings are put on whole minutes; readings of one ID that land on the same minute collide
+resolution = pd.Timedelta("1min")
+
+# What to keep of colliding readings: the first row (as `drop_duplicates` did), or the
+# mean or median of their non-NaN glucose values
+dedup_policies = ["first", "mean", "median"]
+
+
+def id_codes(ids):
+    """
+    Integer code of each ID, numbered in sorted ID order, and the IDs per code.
+    Categoricals from `read_stage` already have sorted categories, so their codes are used as is.
+    """
+    ids = pd.Series(ids, copy=False)
+    if isinstance(ids.dtype, pd.CategoricalDtype) and list(ids.cat.categories) == sorted(ids.cat.categories):
+        return ids.cat.codes.to_numpy(dtype=np.int64), ids.cat.categories.astype(str).to_numpy(dtype=object)
+    codes, uniques = pd.factorize(ids.astype(str), sort=True)
+    return codes.astype(np.int64), np.asarray(uniques, dtype=object)
+
+
+def packed_keys(codes, times, resolution=resolution):
+    """
+    One int64 per row ordering rows by (ID code, time), for times on multiples of `resolution`:
+    code * span + steps since the earliest time, with NaT after every time of its ID.
+    """
+    nat = np.isnat(times)
+    steps = np.where(nat, 0, times.view(np.int64) // resolution.value)
+    first = steps[~nat].min() if (~nat).any() else 0
+    span = (steps[~nat].max() if (~nat).any() else 0) - first + 2
+    if (int(codes.max()) + 1 if len(codes) else 0) * int(span) >= np.iinfo(np.int64).max:
+        raise ValueError(f"{codes.max() + 1} IDs over {span} time steps do not fit a 64-bit key")
+    return codes * span + np.where(nat, span - 1, steps - first)
+
+
+def clean_cgm(df, dedup="first"):
+    """
+    Round times to `resolution`, drop colliding readings and sort by ID and time, on one packed
+    (ID code, time) key: a single stable argsort orders the rows, and equal neighbouring keys
+    are the collisions. With `dedup="first"` the result equals
+    `drop_duplicates(["ID", "time"]).sort_values(["ID", "time"])` after rounding.
+
+    df: columns ID, time (datetime64), glc and any others (taken from the first colliding row).
+    Returns a new DataFrame with a fresh index and ID as strings.
+    """
+    if dedup not in dedup_policies:
+        raise ValueError(f"Unknown dedup policy {dedup!r}; choose from {dedup_policies}")
+
+    times = df["time"].dt.round(resolution).to_numpy(dtype="datetime64[ns]")
+    codes, ids = id_codes(df["ID"])
+    key = packed_keys(codes, times)
+    order = np.argsort(key, kind="stable")
+    first = np.r_[True, key[order[1:]] != key[order[:-1]]] if len(order) else np.ones(0, dtype=bool)
+    rows = order[first]
+
+    out = df.iloc[rows].reset_index(drop=True)
+    out["ID"] = ids[codes[rows]]
+    out["time"] = times[rows]
+    if dedup != "first" and not first.all():
+        # Colliding readings are adjacent in `order`; aggregate them per key
+        group = np.cumsum(first) - 1
+        glc = pd.Series(df["glc"].to_numpy()[order])
+        out["glc"] = glc.groupby(group).agg(dedup).to_numpy().astype(df["glc"].dtype)
+    return out
+
+
+def clean_reference(df):
+    """Reference implementation: the pandas steps `clean_cgm` replaces (first-row dedup)."""
+    df = df.copy()
+    df["ID"] = df["ID"].astype(str)
+    df["time"] = df["time"].dt.round(resolution)
+    df = df.drop_duplicates(subset=["ID", "time"])
+    return df.sort_values(by=["ID", "time"]).reset_index(drop=True)
+
+
+def check_against_reference(df):
+    """Compare `clean_cgm` with the pandas reference; raises AssertionError if they disagree."""
+    pd.testing.assert_frame_equal(clean_cgm(df), clean_reference(df))
+    return len(df)
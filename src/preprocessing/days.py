@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# A full day on the 5-minute grid
+slots_per_day = 288
+slot_length = pd.Timedelta("5min")
+
+# Define the minimum threshold for valid readings (90% of 288 = 259)
+min_readings = int(slots_per_day * 0.9)
+
+
+def complete_days(df, min_readings=min_readings):
+    """
+    Keep the (ID, date) days with at least `min_readings` non-NaN glucose values, in one pass.
+
+    df: rows on the 5-minute grid with columns ID, time, glc.
+    Returns
+        days: DataFrame [ID, date], one row per kept day, sorted by ID and date
+        values: (n_days, 288) float array, NaN where a slot has no row
+        skipped: DataFrame [ID, date, readings] of the dropped days
+    """
+    day = df["time"].dt.floor("D")
+    group = df.groupby(["ID", day], sort=True).ngroup().to_numpy()
+    n_groups = group.max() + 1 if len(group) else 0
+
+    # Non-NaN readings per day, and the ID/date of each day from its first row
+    readings = np.bincount(group, weights=df["glc"].notna().to_numpy(), minlength=n_groups).astype(np.int64)
+    first_row = np.full(n_groups, len(group))
+    np.minimum.at(first_row, group, np.arange(len(group)))
+    ids = df["ID"].to_numpy()[first_row]
+    dates = day.to_numpy()[first_row]
+
+    keep = readings >= min_readings
+    skipped = pd.DataFrame({"ID": ids[~keep], "date": pd.to_datetime(dates[~keep]).date, "readings": readings[~keep]})
+
+    # Scatter the rows of kept days into their slot (minutes of day / 5); off-grid rows are dropped
+    day_index = np.cumsum(keep) - 1
+    offset = (df["time"] - day).to_numpy()
+    slot, remainder = np.divmod(offset, slot_length.to_timedelta64())
+    rows = keep[group] & (remainder == np.timedelta64(0))
+    values = np.full((keep.sum(), slots_per_day), np.nan)
+    values[day_index[group[rows]], slot[rows].astype(np.int64)] = df["glc"].to_numpy(dtype=np.float64)[rows]
+
+    days = pd.DataFrame({"ID": ids[keep], "date": pd.to_datetime(dates[keep]).date})
+    return days, values, skipped
+
+
+def days_to_frame(days, values):
+    """Long format of `complete_days`: 288 rows per day with columns time, glc, ID, date."""
+    start = pd.to_datetime(days["date"]).to_numpy()
+    times = start[:, None] + np.arange(slots_per_day) * slot_length.to_timedelta64()
+    return pd.DataFrame({
+        "time": times.ravel(),
+        "glc": values.ravel(),
+        "ID": np.repeat(days["ID"].to_numpy(), slots_per_day),
+        "date": np.repeat(days["date"].to_numpy(), slots_per_day),
+    })
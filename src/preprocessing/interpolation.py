@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+
+# Resampling grid and gap filling used by step 3
+freq = pd.Timedelta("5min")
+limit = 4  # Fill at most 4 missing slots (20 min) after the last reading
+
+
+def interpolate_per_id(group):
+    """Reference implementation: resample and pchip-interpolate one participant with pandas."""
+    group_numeric = group.set_index("time")[["glc"]].resample(freq).mean()
+    group_numeric["ID"] = group["ID"].iloc[0]
+    group_numeric["glc"] = group_numeric["glc"].interpolate(method="pchip", limit=limit, limit_direction="forward").round(1)
+    return group_numeric.reset_index()
+
+
+def _grid(df):
+    """
+    Put every participant on its own 5-minute grid in one pass.
+    Returns the participant of each grid slot, the slot times and the mean glucose per slot (NaN if empty).
+    """
+    codes, ids = pd.factorize(df["ID"], sort=True)
+    slot = df["time"].values.astype("datetime64[ns]").astype(np.int64) // freq.value
+    glc = df["glc"].to_numpy(dtype=np.float64)
+
+    # Sort by (participant, slot); stable so ties keep file order
+    order = np.lexsort((slot, codes))
+    codes, slot, glc = codes[order], slot[order], glc[order]
+
+    # Mean of the readings falling into each occupied slot
+    new_bin = np.ones(len(slot), dtype=bool)
+    new_bin[1:] = (codes[1:] != codes[:-1]) | (slot[1:] != slot[:-1])
+    starts = np.flatnonzero(new_bin)
+    # pandas' grouped mean (compensated summation, NaN-skipping) so slot means match resample().mean()
+    means = pd.Series(glc).groupby(np.cumsum(new_bin) - 1).mean().to_numpy()
+    bin_codes, bin_slots = codes[starts], slot[starts]
+
+    # Contiguous grid per participant, from its first to its last slot
+    first = np.full(len(ids), np.iinfo(np.int64).max)
+    last = np.full(len(ids), np.iinfo(np.int64).min)
+    np.minimum.at(first, bin_codes, bin_slots)
+    np.maximum.at(last, bin_codes, bin_slots)
+    present = first <= last
+    lengths = np.where(present, last - first + 1, 0)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    grid_codes = np.repeat(np.arange(len(ids)), lengths)
+    grid_slots = np.arange(offsets[-1]) - offsets[grid_codes] + first[grid_codes]
+    grid_glc = np.full(offsets[-1], np.nan)
+    grid_glc[offsets[bin_codes] + bin_slots - first[bin_codes]] = means
+
+    return ids, grid_codes, grid_slots, grid_glc
+
+
+def _pchip_derivatives(x, y, codes):
+    """
+    Slopes at each knot of a piecewise cubic Hermite interpolant (same rules as scipy's PchipInterpolator),
+    computed for all participants at once. Knots are sorted and grouped by `codes`.
+    """
+    n = len(x)
+    d = np.zeros(n)
+    if n < 2:
+        return d
+
+    same = codes[1:] == codes[:-1]  # Interval k joins knots k and k+1 of the same participant
+    h = np.where(same, x[1:] - x[:-1], 1.0)
+    m = np.where(same, (y[1:] - y[:-1]) / h, 0.0)
+
+    # Interior knots: weighted harmonic mean of neighbouring slopes, 0 at extrema
+    inner = np.zeros(n, dtype=bool)
+    inner[1:-1] = same[:-1] & same[1:]
+    k = np.flatnonzero(inner)
+    m0, m1, h0, h1 = m[k - 1], m[k], h[k - 1], h[k]
+    w1, w2 = 2 * h1 + h0, h1 + 2 * h0
+    flat = (np.sign(m0) != np.sign(m1)) | (m0 == 0) | (m1 == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        whmean = (w1 / m0 + w2 / m1) / (w1 + w2)
+        d[k] = np.where(flat, 0.0, 1.0 / whmean)
+
+    # End knots: one-sided three-point estimate, or the secant if only two knots
+    is_first = np.ones(n, dtype=bool)
+    is_first[1:] = ~same
+    is_last = np.ones(n, dtype=bool)
+    is_last[:-1] = ~same
+    for ends, step in ((np.flatnonzero(is_first & ~is_last), 1), (np.flatnonzero(is_last & ~is_first), -1)):
+        if step == 1:
+            h0, m0 = h[ends], m[ends]
+            two = ~inner[np.minimum(ends + 1, n - 1)]
+            h1 = np.where(two, 1.0, h[np.minimum(ends + 1, n - 2)])
+            m1 = np.where(two, 0.0, m[np.minimum(ends + 1, n - 2)])
+        else:
+            h0, m0 = h[ends - 1], m[ends - 1]
+            two = ~inner[ends - 1]
+            h1 = np.where(two, 1.0, h[np.maximum(ends - 2, 0)])
+            m1 = np.where(two, 0.0, m[np.maximum(ends - 2, 0)])
+        edge = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+        edge = np.where(np.sign(edge) != np.sign(m0), 0.0, edge)
+        edge = np.where((np.sign(m0) != np.sign(m1)) & (np.abs(edge) > np.abs(3 * m0)), 3 * m0, edge)
+        d[ends] = np.where(two, m0, edge)
+
+    return d
+
+
+def _fill_positions(grid_codes, grid_glc):
+    """Grid slots to fill: the first `limit` missing slots after each valid reading of a participant."""
+    n = len(grid_glc)
+    valid = ~np.isnan(grid_glc)
+    pos = np.arange(n)
+
+    # Index of the most recent valid slot (or -1), not crossing participants
+    last_valid = np.where(valid, pos, -1)
+    np.maximum.accumulate(last_valid, out=last_valid)
+    starts = np.concatenate(([0], np.flatnonzero(grid_codes[1:] != grid_codes[:-1]) + 1))
+    group_start = np.repeat(starts, np.diff(np.concatenate((starts, [n]))))
+    last_valid = np.where(last_valid >= group_start, last_valid, -1)
+
+    fill = ~valid & (last_valid >= 0) & (pos - last_valid <= limit)
+    return np.flatnonzero(fill)
+
+
+def interpolate_all(df):
+    """
+    Resample every participant to the 5-minute grid and pchip-interpolate short gaps, vectorized
+    over all participants. Equivalent to `groupby("ID").apply(interpolate_per_id)`: slot means,
+    at most `limit` slots filled forward after each reading (trailing slots are extrapolated),
+    values rounded to 0.1. Returns columns time, glc, ID sorted by ID and time.
+    Readings without a time (NaT) are dropped, as resample drops them.
+    """
+    # NaT would become the smallest int64 slot and stretch the grid back to 1677
+    df = df[df["time"].notna()]
+    if df.empty:
+        return pd.DataFrame({"time": pd.Series(dtype="datetime64[ns]"), "glc": pd.Series(dtype=float), "ID": pd.Series(dtype=object)})
+
+    ids, grid_codes, grid_slots, grid_glc = _grid(df)
+    out = grid_glc.copy()
+
+    fill = _fill_positions(grid_codes, grid_glc)
+    if len(fill):
+        knots = np.flatnonzero(~np.isnan(grid_glc))
+        knot_codes = grid_codes[knots]
+        # Nanosecond timestamps as x, like pandas, so results agree to the last bit
+        x = (grid_slots[knots] * freq.value).astype(np.float64)
+        y = grid_glc[knots]
+        d = _pchip_derivatives(x, y, knot_codes)
+
+        # Interval used for each filled slot: the one starting at the previous knot,
+        # or the participant's last interval when extrapolating past its final reading
+        k = np.searchsorted(knots, fill) - 1
+        nxt = np.minimum(k + 1, len(knots) - 1)
+        past_end = (nxt == k) | (knot_codes[nxt] != knot_codes[k])
+        k = np.where(past_end, k - 1, k)
+        single = (k < 0) | (knot_codes[np.maximum(k, 0)] != grid_codes[fill])  # Fewer than 2 readings
+        k = np.maximum(k, 0)
+        k1 = np.minimum(k + 1, len(knots) - 1)
+
+        # Cubic Hermite polynomial of the interval, in the same form scipy's PPoly evaluates
+        dx = np.where(single, 1.0, x[k1] - x[k])
+        slope = (y[k1] - y[k]) / dx
+        t = (d[k] + d[k1] - 2 * slope) / dx
+        c0 = t / dx
+        c1 = (slope - d[k]) / dx - t
+        s = (grid_slots[fill] * freq.value).astype(np.float64) - x[k]
+        values = y[k] + d[k] * s + c1 * (s * s) + c0 * (s * s * s)
+        out[fill] = np.where(single, np.nan, values)
+
+    return pd.DataFrame({
+        "time": pd.to_datetime(grid_slots * freq.value),
+        "glc": np.round(out, 1),
+        "ID": ids.values[grid_codes],
+    })
+
+
+def check_against_reference(df, n_ids=20, seed=0):
+    """
+    Compare `interpolate_all` with the pandas reference on a random sample of participants.
+    Raises AssertionError if they disagree; returns the number of participants checked.
+    """
+    ids = df["ID"].unique()
+    rng = np.random.default_rng(seed)
+    sample = df[df["ID"].isin(rng.choice(ids, size=min(n_ids, len(ids)), replace=False))]
+    sample = sample.sort_values(["ID", "time"])
+
+    expected = sample.groupby("ID", group_keys=False).apply(interpolate_per_id).reset_index(drop=True)
+    actual = interpolate_all(sample)
+
+    pd.testing.assert_frame_equal(actual, expected[["time", "glc", "ID"]], check_dtype=False)
+    return sample["ID"].nunique()
@@ -0,0 +1,105 @@
+import json
+import os
+
+import numpy as np
+
+# Glucose statistics of the resampled data, written by step 5 and read wherever windows are scaled
+stats_file = "data/processed/5_normalization.json"
+
+# minmax: (x - min) / (max - min), as MinMaxScaler(feature_range=(0, 1));
+# zscore: (x - mean) / std, as StandardScaler
+schemes = ["minmax", "zscore"]
+minmax_fill_value = -1  # Missing readings after min-max scaling, below its [0, 1] range
+
+
+class RunningStats:
+    """
+    Count, min, max, mean and (population) SD of a column seen in batches, NaN ignored.
+    Batches are merged with Chan et al.'s parallel update, so one pass over the data is enough
+    and the result does not depend on how the data was split.
+    """
+    def __init__(self, count=0, mean=0.0, m2=0.0, min=np.inf, max=-np.inf):
+        self.count, self.mean, self.m2, self.min, self.max = count, mean, m2, min, max
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        count, mean = len(values), values.mean()
+        m2 = np.square(values - mean).sum()
+        delta = mean - self.mean
+        total = self.count + count
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        return self
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / self.count)) if self.count else float("nan")
+
+    def to_dict(self):
+        return {"count": int(self.count), "min": float(self.min), "max": float(self.max),
+                "mean": float(self.mean), "std": self.std}
+
+
+def save_stats(stats, path=stats_file, **info):
+    """Write statistics (a RunningStats or dict) and any extra `info` to a JSON sidecar."""
+    stats = stats.to_dict() if isinstance(stats, RunningStats) else dict(stats)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({**info, **stats}, f, indent=2)
+
+
+def load_stats(path=stats_file):
+    with open(path) as f:
+        return json.load(f)
+
+
+def default_fill_value(stats, scheme):
+    """
+    Scaled value of missing readings: -1 for minmax, and for zscore (which reaches below -1)
+    the first whole number at least one below the scaled minimum, e.g. -4 for a minimum 2.2 SD
+    below the mean. Derived from the statistics alone, so a checkpoint's Normalizer gets it back.
+    """
+    if scheme == "minmax":
+        return float(minmax_fill_value)
+    std = stats["std"] if stats["std"] > 0 else 1.0
+    return float(np.floor((stats["min"] - stats["mean"]) / std) - 1)
+
+
+class Normalizer:
+    """
+    Scale glucose arrays with stored statistics; missing readings (NaN) become `fill_value`.
+    Callable on arrays of any shape, so it can be a dataset `transform`. Changing `scheme`
+    only needs the statistics, not a rewrite of the data.
+
+    `fill_value` (default: `default_fill_value`) lies outside the scaled data, so missing
+    readings cannot be mistaken for real ones; the model uses it as its mask token too.
+    """
+    def __init__(self, stats, scheme="minmax", fill_value=None):
+        if scheme not in schemes:
+            raise ValueError(f"Unknown normalization scheme {scheme!r}; choose from {schemes}")
+        self.scheme = scheme
+        if scheme == "minmax":
+            self.offset, self.scale = stats["min"], stats["max"] - stats["min"]
+        else:
+            self.offset, self.scale = stats["mean"], stats["std"]
+        if not self.scale > 0:
+            self.scale = 1.0  # Constant data, as scikit-learn handles it
+        self.fill_value = default_fill_value(stats, scheme) if fill_value is None else fill_value
+
+    @classmethod
+    def load(cls, path=stats_file, scheme="minmax", fill_value=None):
+        return cls(load_stats(path), scheme=scheme, fill_value=fill_value)
+
+    def __call__(self, values):
+        scaled = (np.asarray(values, dtype=np.float64) - self.offset) / self.scale
+        return np.where(np.isnan(scaled), self.fill_value, scaled).astype(np.float32)
+
+    def inverse(self, values):
+        """Glucose (mg/dL) of scaled values; `fill_value` entries are not treated specially."""
+        return np.asarray(values, dtype=np.float64) * self.scale + self.offset
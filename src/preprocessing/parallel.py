@@ -0,0 +1,87 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tqdm.auto import tqdm
+
+
+def default_workers():
+    """Number of worker processes: GLYMO_WORKERS if set, otherwise one per CPU available to us."""
+    if os.environ.get("GLYMO_WORKERS"):
+        return int(os.environ["GLYMO_WORKERS"])
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def shard_by_id(df, n_shards, by="ID"):
+    """
+    Split `df` into at most `n_shards` frames of whole participants, in sorted ID order.
+    Each shard is a contiguous range of IDs holding roughly the same number of rows.
+    """
+    codes, _ = pd.factorize(df[by], sort=True)
+    sizes = np.bincount(codes)
+    # Shard of each ID from where its first row falls in the cumulative row count
+    shard_of_id = (np.cumsum(sizes) - sizes) * n_shards // max(len(df), 1)
+    return [shard for _, shard in df.groupby(shard_of_id[codes], sort=True)]
+
+
+def map_shards(func, df, n_workers=None, key=None, progress=False):
+    """
+    Apply `func` to shards of whole participants in a process pool and concatenate the results.
+
+    Shards are balanced ID ranges (about 4 per worker) unless `key` is given, in which
+    case rows sharing a key value (e.g. a cohort) form one shard. Results are concatenated
+    in shard order (keeping their index), so the output does not depend on the worker
+    count or on which worker finishes first. `func` must be a module-level function so it can be pickled,
+    and scripts using this need an `if __name__ == "__main__":` guard.
+    """
+    n_workers = n_workers or default_workers()
+    if key is not None:
+        shards = [shard for _, shard in df.groupby(np.asarray(key), sort=True)]
+    else:
+        shards = shard_by_id(df, n_workers * 4)
+
+    if n_workers == 1 or len(shards) <= 1:
+        results = [func(shard) for shard in tqdm(shards, disable=not progress)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(shards))) as pool:
+            results = list(tqdm(pool.map(func, shards), total=len(shards), disable=not progress))
+
+    results = [r for r in results if len(r)]
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results)
+
+
+def imap_bounded(func, items, n_workers=None, progress=False):
+    """
+    Yield `func(item)` for every item, in order, computed in a process pool that never has
+    more than `n_workers` items in flight. Unlike `map_shards` the results are not collected,
+    so a caller writing each one out holds at most `n_workers` results at a time. `items` may
+    be a generator (e.g. of data chunks): it is only read as workers free up, and one pool
+    serves the whole stream. `func` must be a module-level function (see `map_shards`).
+    """
+    total = len(items) if hasattr(items, "__len__") else None
+    n_workers = n_workers or default_workers()
+    if total is not None:
+        n_workers = min(n_workers, max(total, 1))
+    with tqdm(total=total, disable=not progress) as bar:
+        if n_workers == 1:
+            for item in items:
+                yield func(item)
+                bar.update()
+            return
+
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(func, item))
+                if len(pending) == n_workers:
+                    yield pending.popleft().result()
+                    bar.update()
+            while pending:
+                yield pending.popleft().result()
+                bar.update()
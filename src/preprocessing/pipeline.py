@@ -0,0 +1,209 @@
+"""
+Incremental runner for preprocessing steps 1-8.
+
+Run from the repository root:
+
+    python src/preprocessing/pipeline.py                 # rebuild whatever changed
+    python src/preprocessing/pipeline.py --dry-run       # only show what would run
+    python src/preprocessing/pipeline.py --force --from 5
+    python src/preprocessing/pipeline.py --window-size 96 --stride 48
+
+Every step records content hashes of its inputs, its script and helper modules and its
+parameters in `data/processed/pipeline_state.json`. A step is skipped when none of them
+changed and its outputs are all still there.
+Steps that work cohort by cohort are rerun only for the cohorts whose input changed,
+and their output partitions are replaced in place; cohorts that disappeared are removed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+from storage import processed_folder, stage_path, list_cohorts, clear_stage
+from cleaning import dedup_policies
+from normalization import schemes
+
+scripts_folder = os.path.dirname(os.path.abspath(__file__))
+standardized_folder = "data/processed/cgm/"  # Standardized cohort files (CSV or Parquet) read by step 1
+state_file = os.path.join(processed_folder, "pipeline_state.json")
+
+# Each step: its script and the helper modules it imports (both part of its fingerprint), what
+# it reads and writes (a stage and/or files in processed_folder), whether it can be rebuilt per
+# cohort, and which pipeline parameters it takes (passed on as `--name value`)
+steps = [
+    {"step": 1, "script": "1_combine_cgm.py", "modules": ["storage.py", "parallel.py", "timestamps.py"],
+     "input": standardized_folder, "output": "1_combined_cgm", "per_cohort": True, "params": []},
+    {"step": 2, "script": "2_clean_cgm.py", "modules": ["storage.py", "parallel.py", "cleaning.py"],
+     "input": "1_combined_cgm", "output": "2_cleaned_cgm", "per_cohort": True, "params": ["dedup"]},
+    {"step": 3, "script": "3_interpolate.py", "modules": ["storage.py", "parallel.py", "interpolation.py"],
+     "input": "2_cleaned_cgm", "output": "3_interpolated_cgm", "per_cohort": True, "params": []},
+    {"step": 4, "script": "4_remove_days.py", "modules": ["storage.py", "days.py"],
+     "input": "3_interpolated_cgm", "output": "4_resampled_cgm", "per_cohort": True, "params": []},
+    # Glucose statistics are fit on all cohorts, so this step always reruns as a whole. Only the
+    # statistics are written: windows are normalized in step 8 and in the training dataset.
+    {"step": 5, "script": "5_normalize.py", "modules": ["storage.py", "normalization.py"],
+     "input": "4_resampled_cgm", "output": None, "files": ["5_normalization.json"], "per_cohort": False, "params": []},
+    {"step": 6, "script": "6_windowing.py", "modules": ["storage.py", "windowing.py"],
+     "input": "4_resampled_cgm", "output": "6_cgm_windows", "per_cohort": True, "params": ["window_size", "stride"]},
+    {"step": 7, "script": "7_positional_encoders.py", "modules": ["storage.py"],
+     "input": "6_cgm_windows", "output": None, "files": ["7_cgm_windows.npy"], "per_cohort": False, "params": []},
+    {"step": 8, "script": "8_prepare_masks.py", "modules": ["normalization.py"],
+     "input": ["7_cgm_windows.npy", "5_normalization.json"], "output": None, "files": ["masked_windows.npy", "mask_labels.npy"],
+     "per_cohort": False, "params": ["mask_prob", "scheme"]},
+]
+
+
+def file_hash(path, h=None):
+    """sha256 of a file's content (updates `h` if given)."""
+    h = h or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h
+
+
+def input_hashes(source):
+    """
+    Content hash of each cohort of a step's input: the standardized files for step 1,
+    the partitions of a stage folder, or a single file (keyed "*"). A list of sources
+    gives the hashes of all of them, keyed "<source>:<cohort>".
+    """
+    if isinstance(source, list):
+        return {f"{s}:{cohort}": h for s in source for cohort, h in input_hashes(s).items()}
+
+    if source == standardized_folder:
+        hashes = {}
+        for filename in sorted(os.listdir(source)):
+            if filename.endswith((".csv", ".parquet")):
+                cohort = filename.split("_")[0]
+                hashes[cohort] = file_hash(os.path.join(source, filename), hashlib.sha256(hashes.get(cohort, "").encode())).hexdigest()
+        return hashes
+
+    if os.path.isdir(stage_path(source)):
+        hashes = {}
+        for cohort in list_cohorts(source):
+            folder = os.path.join(stage_path(source), f"cohort={cohort}")
+            h = hashlib.sha256()
+            for filename in sorted(os.listdir(folder)):
+                file_hash(os.path.join(folder, filename), h)
+            hashes[cohort] = h.hexdigest()
+        return hashes
+
+    path = os.path.join(processed_folder, source)
+    return {"*": file_hash(path).hexdigest()} if os.path.exists(path) else {}
+
+
+def step_fingerprint(step, params):
+    """Hash of the step's script and helper module sources and the parameter values it receives."""
+    h = hashlib.sha256()
+    for filename in [step["script"], *step["modules"]]:
+        file_hash(os.path.join(scripts_folder, filename), h)
+    h.update(json.dumps({name: params[name] for name in step["params"]}, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def load_state():
+    if os.path.exists(state_file):
+        with open(state_file) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    with open(state_file, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def output_cohorts(step):
+    """Cohorts with a partition in the step's output stage."""
+    return list_cohorts(step["output"]) if step["output"] and os.path.isdir(stage_path(step["output"])) else []
+
+
+def plan_step(step, params, state, force=False):
+    """
+    Decide what a step has to do. Returns (cohorts, removed, inputs, fingerprint):
+    `cohorts` is None for a full rerun, a list of cohorts to rebuild, or [] to skip.
+    Outputs that went missing since the step last finished (output partitions it had
+    written, or its output files) are rebuilt even if nothing else changed.
+    """
+    inputs = input_hashes(step["input"])
+    fingerprint = step_fingerprint(step, params)
+    previous = state.get(str(step["step"]))
+
+    if force or previous is None or previous["fingerprint"] != fingerprint:
+        return None, [], inputs, fingerprint
+    if any(not os.path.exists(os.path.join(processed_folder, f)) for f in step.get("files", [])):
+        return None, [], inputs, fingerprint
+    if not step["per_cohort"]:
+        return (None if previous["inputs"] != inputs else []), [], inputs, fingerprint
+
+    present = set(output_cohorts(step))
+    changed = sorted(c for c, h in inputs.items()
+                     if previous["inputs"].get(c) != h or (c in previous.get("outputs", []) and c not in present))
+    removed = sorted(c for c in previous["inputs"] if c not in inputs)
+    return changed, removed, inputs, fingerprint
+
+
+def run_step(step, params, cohorts):
+    command = [sys.executable, os.path.join(scripts_folder, step["script"])]
+    if cohorts is not None:
+        command += ["--cohorts", *cohorts]
+    for name in step["params"]:
+        command += [f"--{name.replace('_', '-')}", str(params[name])]
+    print(f"[step {step['step']}] {' '.join(command[1:])}", flush=True)
+    subprocess.run(command, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run preprocessing steps 1-8, rebuilding only what changed.")
+    parser.add_argument("--from", dest="first", type=int, default=1, help="First step to consider")
+    parser.add_argument("--to", dest="last", type=int, default=8, help="Last step to consider")
+    parser.add_argument("--force", action="store_true", help="Rerun the selected steps even if nothing changed")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan without running anything")
+    parser.add_argument("--window-size", type=int, default=288, help="Samples per window (24 h at 5 min)")
+    parser.add_argument("--stride", type=int, default=144, help="Samples between window starts")
+    parser.add_argument("--mask-prob", type=float, default=0.2, help="Probability of masking a glucose value")
+    parser.add_argument("--dedup", default="first", choices=dedup_policies, help="Glucose kept for readings of one ID on the same minute")
+    parser.add_argument("--scheme", default="minmax", choices=schemes, help="Glucose normalization of the masked windows")
+    args = parser.parse_args()
+    params = {"window_size": args.window_size, "stride": args.stride, "mask_prob": args.mask_prob, "dedup": args.dedup, "scheme": args.scheme}
+
+    state = load_state()
+    for step in steps:
+        if not args.first <= step["step"] <= args.last:
+            continue
+
+        cohorts, removed, inputs, fingerprint = plan_step(step, params, state, force=args.force)
+        if cohorts == [] and not removed:
+            print(f"[step {step['step']}] up to date, skipping")
+            continue
+
+        what = "all cohorts" if cohorts is None else f"cohorts {cohorts}" if cohorts else "no cohorts"
+        print(f"[step {step['step']}] rebuilding {what}" + (f", removing {removed}" if removed else ""))
+        if args.dry_run:
+            continue
+
+        # Forget what is about to be rebuilt before touching it: step scripts clear their output
+        # first, so a step that is interrupted must not look up to date on the next run
+        key = str(step["step"])
+        if cohorts is None:
+            state.pop(key, None)
+        elif key in state:
+            state[key]["inputs"] = {c: h for c, h in state[key]["inputs"].items() if c not in cohorts}
+        save_state(state)
+
+        if removed and step["output"]:
+            clear_stage(step["output"], removed)
+        if cohorts is None or cohorts:
+            run_step(step, params, cohorts)
+
+        # Record progress after every step so an interrupted run resumes where it stopped
+        state[key] = {"fingerprint": fingerprint, "inputs": inputs, "outputs": output_cohorts(step)}
+        save_state(state)
+
+
+if __name__ == "__main__":
+    main()
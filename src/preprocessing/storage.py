@@ -0,0 +1,167 @@
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Root folder for all intermediate stage outputs
+processed_folder = "data/processed"
+
+# Set GLYMO_EXPORT_CSV=1 to also write the legacy `<stage>.csv` next to each stage
+export_csv_enabled = os.environ.get("GLYMO_EXPORT_CSV", "0") == "1"
+
+
+def stage_path(stage):
+    """Folder holding the partitioned Parquet dataset of a stage, e.g. `data/processed/2_cleaned_cgm`."""
+    return os.path.join(processed_folder, stage)
+
+
+def cohort_of(ids):
+    """Cohort name of each ID: the prefix before the first "_" (`aleppo_12` -> `aleppo`)."""
+    return pd.Series(ids, copy=False).astype(str).str.split("_", n=1).str[0]
+
+
+def list_cohorts(stage):
+    """Cohorts currently stored for a stage, in sorted order."""
+    path = stage_path(stage)
+    if not os.path.isdir(path):
+        return []
+    return sorted(d.split("=", 1)[1] for d in os.listdir(path) if d.startswith("cohort="))
+
+
+def clear_stage(stage, cohorts=None):
+    """Delete a stage (or only the given cohort partitions) before rewriting it."""
+    path = stage_path(stage)
+    if cohorts is None:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    for cohort in cohorts:
+        shutil.rmtree(os.path.join(path, f"cohort={cohort}"), ignore_errors=True)
+
+
+def write_stage(df, stage, append=False, schema=None):
+    """
+    Write a stage as Parquet files partitioned by cohort (`<stage>/cohort=<name>/part-*.parquet`).
+
+    By default the cohort partitions present in `df` are replaced and all others
+    are left alone. With `append=True` new part files are added instead, for
+    stages that write their output chunk by chunk (call `clear_stage` first).
+    `schema` fixes the Arrow column types, so part files written separately agree.
+    """
+    # Time-stamped names keep part files sorted in write order
+    basename = f"part-{time.time_ns()}.parquet"
+    for cohort, part in df.groupby(cohort_of(df["ID"]).values, sort=True):
+        folder = os.path.join(stage_path(stage), f"cohort={cohort}")
+        if not append:
+            shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False), os.path.join(folder, basename))
+
+
+def export_csv(stage, enabled=None):
+    """Write the legacy single-file `<stage>.csv` for tools that still expect it."""
+    if not (export_csv_enabled if enabled is None else enabled):
+        return
+    output_file = stage_path(stage) + ".csv"
+    header_written = False
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    for batch in iter_stage_batches(stage):
+        batch.to_csv(output_file, mode="a", index=False, header=not header_written)
+        header_written = True
+    print(f"CSV export saved to: {output_file}")
+
+
+def _part_files(stage, cohorts=None):
+    path = stage_path(stage)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Stage {stage} has not been written yet: {path}")
+    files = []
+    # Cohort order, then write order within each cohort
+    for cohort in list_cohorts(stage):
+        if cohorts is not None and cohort not in cohorts:
+            continue
+        folder = os.path.join(path, f"cohort={cohort}")
+        files += [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(".parquet")]
+    return files
+
+
+def read_stage(stage, columns=None, cohorts=None):
+    """
+    Read a stage back as a DataFrame, loading only the requested columns and cohorts.
+    Types (datetime `time`, numeric `glc`) come back as written, so no reparsing is needed.
+    Dictionary-encoded columns come back as categoricals with sorted categories, so they
+    sort like the strings they encode.
+    """
+    tables = [pq.ParquetFile(f).read(columns=columns) for f in _part_files(stage, cohorts)]
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    df = pa.concat_tables(tables).to_pandas()
+    for column in df.columns[df.dtypes == "category"]:
+        df[column] = df[column].cat.reorder_categories(sorted(df[column].cat.categories))
+    return df
+
+
+def iter_stage_batches(stage, columns=None, cohorts=None, batch_size=500000):
+    """Stream a stage in DataFrame batches of at most `batch_size` rows, in stored order."""
+    for f in _part_files(stage, cohorts):
+        for batch in pq.ParquetFile(f).iter_batches(batch_size=batch_size, columns=columns):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+
+def iter_id_chunks(stage, columns=None, cohorts=None, chunk_size=500000):
+    """
+    Stream a stage sorted by ID in chunks of roughly `chunk_size` rows that only contain
+    complete participants. The rows of the last ID in a batch may continue in the next
+    batch, so they are held back and prepended to it; a participant is never split.
+    Memory is bounded by `chunk_size` plus the largest single participant.
+    """
+    carry = None
+    for batch in iter_stage_batches(stage, columns=columns, cohorts=cohorts, batch_size=chunk_size):
+        if carry is not None:
+            batch = pd.concat([carry, batch], ignore_index=True)
+
+        ids = batch["ID"].to_numpy()
+        others = np.flatnonzero(ids != ids[-1])
+        split = others[-1] + 1 if len(others) else 0
+
+        carry = batch.iloc[split:]
+        if split:
+            yield batch.iloc[:split]
+
+    if carry is not None and len(carry):
+        yield carry.reset_index(drop=True)
+
+
+def write_windows(windows, index, stage, cohort):
+    """
+    Replace one cohort of a window stage: `windows.npy` holds the (n_windows, window_size)
+    array and `index.parquet` the ID and start_time of each row.
+    """
+    folder = os.path.join(stage_path(stage), f"cohort={cohort}")
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    np.save(os.path.join(folder, "windows.npy"), windows)
+    pq.write_table(pa.Table.from_pandas(index, preserve_index=False), os.path.join(folder, "index.parquet"))
+
+
+def read_windows(stage, cohort, mmap_mode="r"):
+    """One cohort of a window stage: the windows array (memory-mapped by default) and its index."""
+    folder = os.path.join(stage_path(stage), f"cohort={cohort}")
+    windows = np.load(os.path.join(folder, "windows.npy"), mmap_mode=mmap_mode)
+    index = pq.ParquetFile(os.path.join(folder, "index.parquet")).read().to_pandas()
+    return windows, index
+
+
+def iter_window_batches(stage, cohorts=None, batch_size=1000):
+    """Stream a window stage as (index, windows) batches of at most `batch_size` rows, cohort by cohort."""
+    for cohort in list_cohorts(stage):
+        if cohorts is not None and cohort not in cohorts:
+            continue
+        windows, index = read_windows(stage, cohort)
+        for start in range(0, len(index), batch_size):
+            yield index.iloc[start:start + batch_size], np.asarray(windows[start:start + batch_size])
@@ -1,9 +1,11 @@
-import pandas as pd
+from storage import list_cohorts, read_windows
 
-input_file = "data/processed/6_cgm_windows.csv"
-windows = pd.read_csv(input_file)
+input_stage = "6_cgm_windows"
 
 print(f"Expected window size: 288")
-for i, window in enumerate(windows):
-    if len(window) != 288:
-        print(f"Mismatch at index {i}: window size = {len(window)}")
+for cohort in list_cohorts(input_stage):
+    windows, index = read_windows(input_stage, cohort)
+    if windows.shape[1] != 288:
+        print(f"Mismatch in {cohort}: window size = {windows.shape[1]}")
+    if windows.shape[0] != len(index):
+        print(f"Mismatch in {cohort}: {windows.shape[0]} windows but {len(index)} index rows")
@@ -0,0 +1,74 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# strftime format of the `time` text in each cohort's standardized CSV, by cohort prefix.
+# Parquet files from scripts/preprocessing/ingest.py are already typed and are not parsed.
+time_formats = {
+    "aleppo": "%Y-%m-%d %H:%M:%S",
+    "weinstock": "%Y-%m-%d %H:%M:%S",
+    "tamborlane": "%Y-%m-%d %H:%M:%S",
+    "lynch": "%Y-%m-%d %H:%M:%S",
+    "omalley": "%Y-%m-%d %H:%M:%S",
+    # R leaves out the seconds when all of them are zero, as for these minute readings
+    "chase": "%Y-%m-%d %H:%M",
+}
+
+# Columns of the parse report: rows per way they were parsed
+outcomes = ["format", "iso8601", "inferred", "missing", "unparseable"]
+
+
+def parse_times(values, cohort):
+    """
+    Parse one cohort's `time` values to datetime64[ns] (nanoseconds since the epoch).
+
+    Text is parsed by Arrow with the cohort's exact format from `time_formats`. Rows that
+    do not match it (or every row, for cohorts without a format) are tried as ISO 8601, and
+    what is left with pandas' format inference, as before the registry. Anything still left
+    is NaT. Returns (times, counts) where counts has the number of rows for each of `outcomes`.
+    """
+    counts = dict.fromkeys(outcomes, 0)
+    if pd.api.types.is_datetime64_any_dtype(getattr(values, "dtype", None)):
+        times = pd.Series(values, copy=False).to_numpy(dtype="datetime64[ns]")
+        counts["missing"] = int(np.isnat(times).sum())
+        counts["format"] = len(times) - counts["missing"]
+        return times, counts
+
+    text = values.combine_chunks() if isinstance(values, pa.ChunkedArray) else pa.array(values, from_pandas=True)
+    text = pc.utf8_trim_whitespace(text if pa.types.is_string(text.type) else text.cast(pa.string()))
+    present = pc.fill_null(pc.not_equal(text, ""), False).to_numpy(zero_copy_only=False)
+    counts["missing"] = int((~present).sum())
+    times = np.full(len(text), np.datetime64("NaT"), dtype="datetime64[ns]")
+    todo = present.copy()
+
+    fmt = time_formats.get(cohort)
+    if fmt is not None:
+        parsed = pc.strptime(text, format=fmt, unit="s", error_is_null=True)
+        parsed = parsed.to_numpy(zero_copy_only=False).astype("datetime64[ns]")
+        ok = todo & ~np.isnat(parsed)
+        times[ok] = parsed[ok]
+        counts["format"] = int(ok.sum())
+        todo &= ~ok
+
+    # Fallbacks only see the rows the format did not match; ISO 8601 only text that starts
+    # like an ISO date, since failing rows are slow to reject
+    iso_like = pc.fill_null(pc.match_substring_regex(text, r"^\d{4}-\d{2}-\d{2}"), False).to_numpy(zero_copy_only=False)
+    for outcome, fallback in [("iso8601", "ISO8601"), ("inferred", None)]:
+        rows = np.flatnonzero(todo & iso_like if outcome == "iso8601" else todo)
+        if not len(rows):
+            continue
+        with warnings.catch_warnings():
+            # Inference falls back to dateutil one element at a time and says so
+            warnings.simplefilter("ignore", UserWarning)
+            parsed = pd.to_datetime(text.take(rows).to_pandas(), format=fallback, errors="coerce")
+        parsed = parsed.to_numpy(dtype="datetime64[ns]")
+        ok = ~np.isnat(parsed)
+        times[rows[ok]] = parsed[ok]
+        counts[outcome] = int(ok.sum())
+        todo[rows[ok]] = False
+
+    counts["unparseable"] = int(todo.sum())
+    return times, counts
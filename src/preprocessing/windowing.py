@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Define window size and stride
+window_size = 288  # 24 hours at 5-min intervals
+stride = 144  # 50% overlap
+sample_interval = pd.Timedelta("5min")
+
+
+def window_starts(lengths, window_size=window_size, stride=stride):
+    """
+    Start offsets of all windows over consecutive series of the given lengths:
+    positions 0, stride, 2*stride, ... of each series that leave room for a full window.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    counts = np.where(lengths >= window_size, (lengths - window_size) // stride + 1, 0)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(offsets, counts) + stride * (np.arange(counts.sum()) - first)
+
+
+def create_windows(df, window_size=window_size, stride=stride, split_on_gaps=False):
+    """
+    Sliding windows over every participant's glucose series, without Python loops.
+
+    df: columns ID, time, glc. Each participant's rows are windowed from its first row,
+    like the original per-ID loop. With `split_on_gaps`, a window never spans a jump in
+    time (e.g. a dropped day): every contiguous 5-minute run is windowed on its own.
+
+    Returns
+        windows: (n_windows, window_size) float32 array
+        index: DataFrame [ID, start_time], one row per window
+    """
+    df = df.sort_values(["ID", "time"], kind="stable")
+    ids = df["ID"].to_numpy()
+    times = df["time"].to_numpy()
+    values = df["glc"].to_numpy(dtype=np.float32)
+
+    # Series boundaries: a new participant, or a gap in time if requested
+    new_series = np.ones(len(df), dtype=bool)
+    new_series[1:] = ids[1:] != ids[:-1]
+    if split_on_gaps:
+        new_series[1:] |= np.diff(times) != sample_interval.to_timedelta64()
+    lengths = np.diff(np.append(np.flatnonzero(new_series), len(df)))
+
+    starts = window_starts(lengths, window_size, stride)
+    if len(values) < window_size:
+        windows = np.empty((0, window_size), dtype=np.float32)
+    else:
+        # Zero-copy (n - window_size + 1, window_size) view; only the selected rows are copied
+        windows = sliding_window_view(values, window_size)[starts]
+
+    index = pd.DataFrame({"ID": ids[starts], "start_time": times[starts]})
+    return windows, index
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The pipeline scripts import their helpers as flat sibling modules; make them importable here
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ["src/preprocessing", "src/prep_data", "src/baby_model"]:
+    sys.path.insert(0, os.path.join(root, folder))
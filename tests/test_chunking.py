@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from interpolation import interpolate_all
+from storage import iter_id_chunks, read_stage, write_stage
+
+scripts_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "preprocessing")
+chunk_size = 16  # Far fewer rows than a participant has, so every participant spans several reads
+
+
+@pytest.fixture
+def cleaned(tmp_path, monkeypatch):
+    """Step 2 output of five participants in two cohorts, in a temporary data/processed."""
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    frames = []
+    for id_, n in [("aleppo_1", 40), ("aleppo_2", 7), ("aleppo_3", 55), ("diatrend_1", 30), ("diatrend_2", 1)]:
+        minutes = np.sort(rng.choice(np.arange(0, 5 * 3 * n, 1), n, replace=False))
+        frames.append(pd.DataFrame({"ID": id_, "time": pd.Timestamp("2020-01-01") + pd.to_timedelta(minutes, unit="min"),
+                                    "glc": rng.normal(150, 40, n).round()}))
+    df = pd.concat(frames, ignore_index=True)
+    df.loc[rng.choice(len(df), 5, replace=False), "glc"] = np.nan
+    write_stage(df, "2_cleaned_cgm")
+    return read_stage("2_cleaned_cgm", columns=["ID", "time", "glc"])
+
+
+def plain(df):
+    return df.assign(ID=df["ID"].astype(str)).sort_values(["ID", "time"]).reset_index(drop=True)
+
+
+def test_chunks_keep_participants_whole(cleaned):
+    chunks = list(iter_id_chunks("2_cleaned_cgm", columns=["ID", "time", "glc"], chunk_size=chunk_size))
+    assert len(chunks) > 2
+    ids = [set(chunk["ID"].astype(str)) for chunk in chunks]
+    for i, chunk_ids in enumerate(ids):
+        assert not chunk_ids & set().union(*ids[:i], *ids[i + 1:])
+    pd.testing.assert_frame_equal(plain(pd.concat(chunks)), plain(cleaned))
+
+
+def test_chunked_step_3_equals_one_pass(cleaned):
+    subprocess.run([sys.executable, os.path.join(scripts_folder, "3_interpolate.py"), "--chunk-size", str(chunk_size)],
+                   check=True, capture_output=True, env={**os.environ, "GLYMO_WORKERS": "2"})
+    chunked = read_stage("3_interpolated_cgm")
+    pd.testing.assert_frame_equal(plain(chunked), plain(interpolate_all(cleaned)), check_dtype=False)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+from cleaning import clean_cgm, check_against_reference
+
+
+@pytest.fixture
+def readings():
+    # Unsorted readings of three IDs with seconds, so several round onto the same minute
+    return pd.DataFrame({
+        "ID": ["b", "a", "a", "b", "a", "c", "a", "b", "c"],
+        "time": pd.to_datetime(["2020-01-01 00:10:10", "2020-01-01 00:05:20", "2020-01-01 00:05:40",
+                                "2020-01-01 00:09:50", "2020-01-01 00:00:00", None,
+                                "2020-01-01 00:05:50", "2020-01-01 00:20:00", "2020-01-01 00:01:00"]),
+        "glc": [120.0, 100.0, 110.0, 130.0, 90.0, 80.0, np.nan, 140.0, 150.0],
+        "device": "intervals_5mins",
+    })
+
+
+def test_matches_pandas_reference(readings):
+    assert check_against_reference(readings) == len(readings)
+
+
+def test_matches_pandas_reference_with_categorical_ids(readings):
+    # IDs as `read_stage` returns them
+    check_against_reference(readings.assign(ID=readings["ID"].astype("category")))
+
+
+@pytest.mark.parametrize("dedup, merged", [("first", 120), ("mean", 125), ("median", 125)])
+def test_dedup_policies(readings, dedup, merged):
+    # b's 00:09:50 and 00:10:10 readings collide; a's 00:05:40 and 00:05:50 too, with NaN skipped
+    out = clean_cgm(readings, dedup=dedup)
+    assert list(out["ID"]) == ["a", "a", "a", "b", "b", "c", "c"]
+    assert out["time"].iloc[-1] is pd.NaT
+    np.testing.assert_array_equal(out["glc"], [90, 100, 110, merged, 140, 150, 80])
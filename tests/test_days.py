@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from days import complete_days, days_to_frame, min_readings, slots_per_day
+
+
+def resample_per_day(group):
+    """The per-(ID, date) groupby step 4 used before complete_days (without its printing)."""
+    if group["glc"].notna().sum() < min_readings:
+        return pd.DataFrame()
+    full_day_index = pd.date_range(start=f"{group['time'].iloc[0].date()} 00:00:00",
+                                   end=f"{group['time'].iloc[0].date()} 23:55:00", freq="5min")
+    resampled = group.set_index("time").reindex(full_day_index)
+    resampled.index.name = "time"
+    resampled["ID"] = group["ID"].iloc[0]
+    resampled["date"] = group["date"].iloc[0]
+    return resampled.reset_index()
+
+
+def reference(df):
+    df = df.assign(date=df["time"].dt.date)
+    return df.groupby(["ID", "date"]).apply(resample_per_day).reset_index(drop=True)
+
+
+def participant(id_, start, end, missing=0, seed=0):
+    """Readings on the 5-minute grid from `start` to `end` (excluded), with `missing` random NaN."""
+    time = pd.date_range(start, end, freq="5min", inclusive="left")
+    glc = np.random.default_rng(seed).normal(150, 40, len(time)).round()
+    glc[np.random.default_rng(seed + 1).choice(len(time), missing, replace=False)] = np.nan
+    return pd.DataFrame({"ID": id_, "time": time, "glc": glc})
+
+
+@pytest.fixture
+def readings():
+    # A day at exactly the threshold: 288 slots, 288 - min_readings of them NaN
+    at_threshold = participant("at_threshold", "2020-03-01", "2020-03-02", missing=slots_per_day - min_readings, seed=4)
+    below = participant("below", "2020-03-01", "2020-03-02", missing=slots_per_day - min_readings + 1, seed=6)
+    return pd.concat([
+        # Partial first and last days (starting 13:00, ending 09:00) around two full days
+        participant("partial", "2020-01-01 13:00", "2020-01-04 09:00", missing=20, seed=0),
+        # Complete days with a few NaN, and a second ID on the same dates
+        participant("complete", "2020-01-02", "2020-01-05", missing=15, seed=2),
+        at_threshold,
+        below,
+        # A reading off the 5-minute grid, dropped by the reindex
+        pd.DataFrame({"ID": ["complete"], "time": [pd.Timestamp("2020-01-03 12:02")], "glc": [99.0]}),
+    ], ignore_index=True).sort_values(["ID", "time"], ignore_index=True)
+
+
+def test_matches_groupby_reference(readings):
+    days, values, skipped = complete_days(readings)
+    expected = reference(readings)
+    actual = days_to_frame(days, values)
+    assert sorted(actual.columns) == sorted(expected.columns)
+    pd.testing.assert_frame_equal(actual, expected[actual.columns], check_dtype=False)
+
+
+def test_threshold_and_skipped_days(readings):
+    days, values, skipped = complete_days(readings)
+    assert "at_threshold" in set(days["ID"]) and "below" not in set(days["ID"])
+    assert (values.shape[1] == slots_per_day) and (np.isfinite(values).sum(axis=1) >= min_readings).all()
+    partial = skipped[skipped["ID"] == "partial"]
+    assert [str(d) for d in partial["date"]] == ["2020-01-01", "2020-01-04"]
+    assert skipped.loc[skipped["ID"] == "below", "readings"].tolist() == [min_readings - 1]
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from interpolation import interpolate_all, interpolate_per_id, check_against_reference
+
+
+def participant(id_, times, glc):
+    return pd.DataFrame({"ID": id_, "time": pd.to_datetime(times), "glc": np.asarray(glc, dtype=float)})
+
+
+@pytest.fixture
+def readings():
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2020-01-01 00:02")
+
+    # Irregular 5-minute readings with a short gap (filled) and a long one (left partly empty)
+    times = start + pd.to_timedelta(np.r_[0:60:5, 75:100:5, 160:200:5] + rng.integers(0, 3, 25), unit="min")
+    gaps = participant("gaps", times, rng.normal(150, 30, len(times)).round())
+
+    # Several readings in one slot (averaged)
+    crowded = participant("crowded", start + pd.to_timedelta([0, 1, 2, 3, 7, 8, 21, 22], unit="min"), [100, 104, 108, 112, 90, 91, 120, 124])
+
+    # One reading only: nothing to interpolate from
+    single = participant("single", [start], [140])
+
+    # Readings without a time among valid ones (kept by step 2, NaT last)
+    with_nat = participant("with_nat", list(start + pd.to_timedelta(np.arange(0, 50, 5), unit="min")) + [pd.NaT, pd.NaT],
+                           np.r_[np.linspace(100, 160, 10), 200, 210])
+
+    return pd.concat([gaps, crowded, single, with_nat], ignore_index=True)
+
+
+def test_matches_pandas_reference(readings):
+    assert check_against_reference(readings) == 4
+
+
+def test_nat_rows_are_dropped(readings):
+    out = interpolate_all(readings)
+    with_nat = out[out["ID"] == "with_nat"]
+    assert len(with_nat) == len(interpolate_per_id(readings[readings["ID"] == "with_nat"])) == 10
+    assert out["time"].between("2020-01-01", "2020-01-02").all()
+
+
+def test_participant_with_only_nat_times_is_left_out(readings):
+    no_times = participant("no_times", [pd.NaT, pd.NaT], [120, 130])
+    out = interpolate_all(pd.concat([readings, no_times], ignore_index=True))
+    assert "no_times" not in set(out["ID"])
+    pd.testing.assert_frame_equal(out, interpolate_all(readings))
@@ -0,0 +1,29 @@
+import os
+
+import torch
+from model import TransformerModel, load_checkpoint, save_checkpoint
+
+legacy_checkpoint = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "baby_transformer_cgm.pth")
+
+
+def test_shipped_legacy_checkpoint_loads_and_runs():
+    # A plain state_dict from before configs were saved, and before the model had a `norm` layer
+    model, checkpoint = load_checkpoint(legacy_checkpoint)
+    assert model.config["norm"] is False and isinstance(model.norm, torch.nn.Identity)
+    assert (model.config["embed_dim"], model.config["num_layers"], model.config["pe_dim"]) == (32, 2, 32)
+
+    with torch.inference_mode():
+        outputs = model(torch.rand(3, 96))
+    assert outputs.shape == (3, 96, 33) and torch.isfinite(outputs).all()
+
+
+def test_checkpoint_round_trip(tmp_path):
+    torch.manual_seed(0)
+    model = TransformerModel(embed_dim=8, num_heads=2, ff_dim=16, num_layers=1, dropout=0.0, pe_dim=4, max_len=12).eval()
+    save_checkpoint(model, str(tmp_path / "model.pth"))
+    loaded, checkpoint = load_checkpoint(str(tmp_path / "model.pth"))
+    assert loaded.config == model.config and isinstance(loaded.norm, torch.nn.LayerNorm)
+
+    x = torch.rand(2, 12)
+    with torch.inference_mode():
+        torch.testing.assert_close(loaded(x), model(x))
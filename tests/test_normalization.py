@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from normalization import Normalizer, RunningStats
+
+
+@pytest.fixture
+def stats():
+    glucose = np.random.default_rng(0).normal(150, 50, 10_000).clip(40, 400)
+    return RunningStats().update(glucose).to_dict()
+
+
+@pytest.mark.parametrize("scheme", ["minmax", "zscore"])
+def test_fill_value_is_outside_the_scaled_range(stats, scheme):
+    normalizer = Normalizer(stats, scheme=scheme)
+    scaled = normalizer(np.array([stats["min"], stats["max"], np.nan]))
+    assert normalizer.fill_value < scaled[:2].min() - 0.5
+    assert scaled[2] == normalizer.fill_value
+
+
+def test_zscore_fill_value_is_not_minus_one(stats):
+    # z-scores of real readings reach below -1, so -1 would stand for a reading of mean - SD
+    assert Normalizer(stats, scheme="zscore")(np.array([stats["min"]]))[0] < -1
+    assert Normalizer(stats, scheme="zscore").fill_value == -4
+    assert Normalizer(stats, scheme="minmax").fill_value == -1
+
+
+@pytest.mark.parametrize("scheme", ["minmax", "zscore"])
+def test_inverse(stats, scheme):
+    normalizer = Normalizer(stats, scheme=scheme)
+    glucose = np.array([40.0, 123.0, 400.0])
+    np.testing.assert_allclose(normalizer.inverse(normalizer(glucose)), glucose, rtol=1e-5)
@@ -0,0 +1,46 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import pipeline
+from storage import write_stage
+
+
+@pytest.fixture
+def stages(tmp_path, monkeypatch):
+    """Stage 3 and 4 of two cohorts in a temporary data/processed, and step 4's recorded state."""
+    monkeypatch.chdir(tmp_path)
+    readings = pd.DataFrame({"ID": ["aleppo_1", "aleppo_1", "diatrend_2"],
+                             "time": pd.to_datetime(["2020-01-01 00:00", "2020-01-01 00:05", "2020-01-01 00:00"]),
+                             "glc": [100.0, 110.0, 120.0]})
+    write_stage(readings, "3_interpolated_cgm")
+    write_stage(readings, "4_resampled_cgm")
+    step = next(s for s in pipeline.steps if s["step"] == 4)
+    inputs = pipeline.input_hashes(step["input"])
+    state = {"4": {"fingerprint": pipeline.step_fingerprint(step, {}), "inputs": inputs,
+                   "outputs": pipeline.output_cohorts(step)}}
+    return step, state
+
+
+def test_up_to_date_step_is_skipped(stages):
+    step, state = stages
+    assert pipeline.plan_step(step, {}, state)[0] == []
+
+
+def test_missing_output_partition_is_rebuilt(stages):
+    step, state = stages
+    shutil.rmtree(os.path.join("data/processed/4_resampled_cgm", "cohort=diatrend"))
+    assert pipeline.plan_step(step, {}, state)[0] == ["diatrend"]
+
+
+def test_helper_modules_are_fingerprinted(tmp_path, monkeypatch):
+    step = next(s for s in pipeline.steps if s["step"] == 4)
+    for filename in [step["script"], *step["modules"]]:
+        shutil.copy(os.path.join(pipeline.scripts_folder, filename), tmp_path)
+    monkeypatch.setattr(pipeline, "scripts_folder", str(tmp_path))
+    before = pipeline.step_fingerprint(step, {})
+    with open(tmp_path / "days.py", "a") as f:
+        f.write("\n# changed\n")
+    assert pipeline.step_fingerprint(step, {}) != before
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from rolling_metrics import rolling_metrics, check_against_reference
+
+
+def participant(id_, minutes, glc):
+    time = pd.Timestamp("2020-01-01") + pd.to_timedelta(minutes, unit="min")
+    return pd.DataFrame({"ID": id_, "glc": np.asarray(glc, dtype=float)}, index=pd.DatetimeIndex(time, name="time"))
+
+
+@pytest.fixture
+def readings():
+    rng = np.random.default_rng(0)
+    minutes = np.arange(0, 8 * 60, 5)
+
+    # Integer mg/dL, as meters report it: repeated values give flat peaks and troughs for MAGE
+    steps = rng.choice([-12, -6, 0, 0, 0, 6, 12], size=len(minutes))
+    integer = participant("integer", minutes, np.clip(140 + np.cumsum(steps), 45, 380).round())
+
+    # A wide swing through every range, with missing readings and a gap longer than the window
+    kept = (minutes < 150) | (minutes > 260)
+    swing = 150 + 110 * np.sin(minutes / 40) + rng.normal(0, 8, len(minutes))
+    swing[rng.choice(len(minutes), 10, replace=False)] = np.nan
+    gappy = participant("gappy", minutes[kept], swing[kept])
+
+    # Flat trace (SD 0) and a single reading
+    flat = participant("flat", minutes[:20], np.full(20, 110))
+    single = participant("single", [0], [95])
+
+    return pd.concat([integer, gappy, flat, single])
+
+
+def test_matches_calculate_metrics(readings):
+    assert check_against_reference(readings) == 4
+
+
+def test_integer_plateaus_give_mage(readings):
+    mage = rolling_metrics(readings)["mage"]
+    assert mage[readings["ID"] == "integer"].notna().sum() > 0
@@ -0,0 +1,42 @@
+import os
+import socket
+
+import numpy as np
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from dataset import MaskedCGMDataset
+from model import TransformerModel
+from train_ddp import check_grads, setup
+
+world_size = 2
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def check_grads_on_rank(rank, windows_file, port):
+    # What torchrun sets for each process; without a GPU setup() joins with gloo
+    os.environ.update(RANK=str(rank), LOCAL_RANK=str(rank), WORLD_SIZE=str(world_size),
+                      MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port))
+    torch.set_num_threads(1)
+    rank, size, device = setup()
+    try:
+        dataset = MaskedCGMDataset(windows_file, mask_mode="dynamic", mask_prob=0.3, seed=0)
+        torch.manual_seed(0)
+        model = TransformerModel(embed_dim=8, num_heads=2, ff_dim=16, num_layers=1, dropout=0.0, pe_dim=4, max_len=12).to(device)
+        assert check_grads(model, dataset, 4, rank, size, device, shuffle=True)
+    finally:
+        dist.destroy_process_group()
+
+
+@pytest.mark.skipif(not dist.is_available() or torch.cuda.is_available(), reason="needs torch.distributed with gloo on CPU")
+def test_ddp_gradients_match_single_process(tmp_path):
+    windows_file = str(tmp_path / "windows.npy")
+    np.save(windows_file, np.random.default_rng(0).uniform(0, 1, (16, 12)).astype(np.float32))
+    mp.spawn(check_grads_on_rank, args=(windows_file, free_port()), nprocs=world_size)
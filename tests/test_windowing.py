@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from windowing import create_windows
+
+
+def reference(df, window_size, stride):
+    """The per-ID loop step 6 used before create_windows: (ID, start_time, values) per window."""
+    windows = []
+    for id_, group in df.groupby("ID", sort=True):
+        group = group.sort_values("time")
+        values, times = group["glc"].to_numpy(), group["time"].to_numpy()
+        if len(values) < window_size:
+            continue
+        for i in range(0, len(values) - window_size + 1, stride):
+            windows.append((id_, times[i], values[i:i + window_size]))
+    return windows
+
+
+def participant(id_, n, seed):
+    time = pd.Timestamp("2020-01-01") + np.arange(n) * pd.Timedelta("5min")
+    glc = np.random.default_rng(seed).normal(150, 40, n).round()
+    return pd.DataFrame({"ID": id_, "time": time, "glc": glc})
+
+
+@pytest.fixture
+def readings():
+    # 29 rows: stride 4 does not divide 29 - 10; 10 rows: exactly one window; 7 rows: shorter than a window
+    df = pd.concat([participant("b", 29, 0), participant("a", 10, 1), participant("c", 7, 2), participant("d", 40, 3)])
+    return df.sample(frac=1, random_state=0)  # create_windows sorts by ID and time itself
+
+
+@pytest.mark.parametrize("window_size, stride", [(10, 4), (10, 10), (8, 3), (50, 5)])
+def test_matches_loop_reference(readings, window_size, stride):
+    windows, index = create_windows(readings, window_size=window_size, stride=stride)
+    expected = reference(readings, window_size, stride)
+
+    assert windows.shape == (len(expected), window_size)
+    assert list(index["ID"]) == [id_ for id_, _, _ in expected]
+    np.testing.assert_array_equal(index["start_time"].to_numpy(), np.array([t for _, t, _ in expected], dtype="datetime64[ns]"))
+    if expected:
+        np.testing.assert_array_equal(windows, np.stack([v for _, _, v in expected]).astype(np.float32))
+
+
+def test_short_series_and_offsets(readings):
+    windows, index = create_windows(readings, window_size=10, stride=4)
+    assert "c" not in set(index["ID"])
+    start = pd.Timestamp("2020-01-01")
+    offsets = ((index["start_time"] - start) / pd.Timedelta("5min")).astype(int)
+    assert offsets[index["ID"] == "b"].tolist() == [0, 4, 8, 12, 16]
+    assert offsets[index["ID"] == "a"].tolist() == [0]